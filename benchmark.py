@@ -0,0 +1,183 @@
+import argparse
+import contextlib
+import io
+import json
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+from scipy import signal
+
+import evolved_psos
+import soa_engine
+import soa_models
+
+
+# (n particles, m dimensions, q SOAs) configurations
+SIZES = {
+    'quick': [(10, 10, 1), (20, 24, 2)],
+    'full': [(10, 10, 1), (20, 24, 2), (50, 60, 2), (200, 240, 2), (1000, 240, 2)],
+}
+
+BACKENDS = ['foh', 'zoh', 'operator']
+
+if hasattr(signal, 'lsim2'):
+    BACKENDS.insert(0, 'lsim2')
+
+# lsim2 takes ~0.1 s per signal, so it only sees a few particles
+LSIM2_MAX_PARTICLES = 4
+
+
+def problem(n, m, q, backend, seed = 0):
+    """
+    This method sets up a synthetic optimisation problem on the SOA model,
+    no hardware or soa package needed
+    Args:
+    - n, m, q = particles, dimensions and SOAs
+    - backend = simulation backend
+    - seed = seed of the synthetic population
+    Returns:
+    - dict of optimiser arguments and a random population
+    """
+    rng = np.random.RandomState(seed)
+
+    kwargs = dict(m = m, q = q, cost_f = 'mSE', st_importance_factor = 1, backend = backend,
+                  **soa_models.step_problem(q))
+
+    x = rng.uniform(-1, 1, (n, m * q))
+    v = rng.uniform(-0.05, 0.05, (n, m * q))
+
+    return kwargs, x, v
+
+
+def measure(function, repeat):
+    """
+    This method times a function and records its peak memory
+    Args:
+    - function = function without arguments
+    - repeat = number of timed calls
+    Returns:
+    - (times, peak) = duration of every call, peak traced memory in bytes
+    """
+    # warm up caches (discretisations, operators)
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+
+    times = []
+
+    for _ in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function()
+            times.append(time.perf_counter() - start)
+
+    # tracing slows allocations down, so memory is measured on its own call
+    tracemalloc.start()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return times, peak
+
+
+def run(sizes, backends, repeat):
+    """
+    This method runs every benchmark for every size and backend
+    Returns:
+    - list of result records
+    """
+    results = []
+
+    for (n, m, q) in sizes:
+
+        for backend in backends:
+
+            n_b = min(n, LSIM2_MAX_PARTICLES) if backend == 'lsim2' else n
+
+            kwargs, x, v = problem(n_b, m, q, backend)
+
+            engine = soa_engine.soa_engine(kwargs['sim_model'], kwargs['t2'], kwargs['X0'], m, q,
+                                           kwargs['cost_f'], kwargs['st_importance_factor'],
+                                           kwargs['SP'], backend = backend)
+            kwargs['engine'] = engine
+
+            costs = engine.evaluate_batch(x)
+            gbest = x[np.argmin(costs)]
+
+            ch = evolved_psos.chaos(n_b, rep = 2 * n_b, **kwargs)
+            ol = evolved_psos.ol(**kwargs)
+            cpso = evolved_psos.cpso_sk(n_b, x = np.copy(x), x_value = None, pbest = np.copy(x),
+                                        pbest_value = None, gbest = np.copy(gbest), v = np.copy(v),
+                                        c1_min = 0.5, c1_max = 2.0, c2_min = 0.5, c2_max = 2.0,
+                                        w_init = 0.9, w_final = 0.4, **kwargs)
+
+            def cls():
+                ch.rep = 2 * n_b
+                ch.cls(np.copy(x), np.copy(costs), np.copy(x), np.copy(costs), np.copy(gbest),
+                       costs.min(), [costs.min()])
+
+            benchmarks = {
+                'get_cost': lambda: engine.get_cost(x[0]),
+                'outputs': lambda: engine.outputs(x),
+                'evaluate_batch': lambda: engine.evaluate_batch(x),
+                'chaos.cls': cls,
+                'ol.evaluate': lambda: ol.evaluate(x[0], gbest),
+                'cpso_sk.partition': cpso.partition,
+            }
+
+            for name, function in benchmarks.items():
+
+                count = engine.evaluations
+                times, peak = measure(function, repeat)
+
+                # outputs() simulates without going through the cost path
+                if name == 'outputs':
+                    evaluations = n_b * (repeat + 2)
+                else:
+                    evaluations = engine.evaluations - count
+
+                # the warm-up and memory calls are not timed
+                evaluations = evaluations * repeat / (repeat + 2)
+
+                record = {
+                    'benchmark': name, 'backend': backend, 'n': n_b, 'm': m, 'q': q,
+                    'latency_s': float(np.median(times)),
+                    'evals_per_s': evaluations / float(np.sum(times)),
+                    'evaluations': evaluations,
+                    'peak_mem_bytes': peak,
+                }
+                results.append(record)
+
+                print(f"{name:18s} {backend:8s} n={n_b:5d} m={m:4d} q={q} "
+                      f"{record['evals_per_s']:12.1f} evals/s {record['latency_s'] * 1e3:10.3f} ms "
+                      f"{record['peak_mem_bytes'] / 1e6:8.2f} MB")
+
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Benchmark the simulation, cost and optimiser hot paths')
+    parser.add_argument('--sizes', choices = sorted(SIZES), default = 'quick')
+    parser.add_argument('--backends', nargs = '+', default = BACKENDS)
+    parser.add_argument('--repeat', type = int, default = 5)
+    parser.add_argument('--output', default = 'benchmark_results.json')
+    args = parser.parse_args()
+
+    results = run(SIZES[args.sizes], args.backends, args.repeat)
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'scipy': scipy.__version__,
+            'machine': platform.machine(),
+            'results': results,
+        }, f, indent = 1)
+
+    print(f'Results written to {args.output}')
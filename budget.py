@@ -0,0 +1,57 @@
+import time
+
+
+class budget:
+
+    def __init__(self, time_limit = None, max_evaluations = None):
+        '''
+        Wall clock and evaluation limits of a run, checked by the optimisers
+        between two evaluations through soa_engine.exhausted(). A batch that
+        has started is finished, so a run stops at most one batch past a limit
+
+        Parameters:
+        - time_limit: seconds from start(), no limit if None
+        - max_evaluations: signals simulated at full resolution (the
+          evaluations counter of the engine, resumed runs included), no
+          limit if None
+        '''
+
+        self.time_limit = time_limit
+        self.max_evaluations = max_evaluations
+
+        self.start()
+
+
+    def start(self):
+        """
+        This method starts the clock of time_limit
+        """
+
+        self.__start = time.monotonic()
+
+
+    def elapsed(self):
+        """
+        Returns the seconds since start()
+        """
+
+        return time.monotonic() - self.__start
+
+
+    def exhausted(self, evaluations):
+        """
+        This method checks the limits
+        Args:
+        - evaluations = evaluations so far
+        Returns:
+        - 'time_limit' or 'max_evaluations' if that limit is reached, None
+        otherwise
+        """
+
+        if self.max_evaluations is not None and evaluations >= self.max_evaluations:
+            return 'max_evaluations'
+
+        if self.time_limit is not None and self.elapsed() >= self.time_limit:
+            return 'time_limit'
+
+        return None
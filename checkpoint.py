@@ -0,0 +1,152 @@
+import os
+import random
+import tempfile
+
+import numpy as np
+
+
+# bumped whenever the layout of a checkpoint changes
+VERSION = 1
+
+
+# base of the objects saved by checkpoints, state_dict() and load_state_dict()
+# copy the attributes named in the STATE tuple of the class
+class stateful:
+
+    # attributes saved by checkpoints, set by each subclass
+    STATE = ()
+
+    def state_dict(self):
+        """
+        Returns the attributes named in STATE, as arrays
+        """
+
+        return {name: np.copy(getattr(self, name)) for name in self.STATE}
+
+
+    def load_state_dict(self, state):
+        """
+        Restores the state returned by state_dict, 0-d arrays as scalars
+        """
+
+        for name in self.STATE:
+            value = np.asarray(state[name])
+            setattr(self, name, value.item() if value.ndim == 0 else np.copy(value))
+
+
+def flatten(state, prefix = ''):
+    """
+    This method flattens a nested dict of arrays into one level
+    Args:
+    - state = dict whose values are arrays, scalars, strings or dicts
+    - prefix = key prefix of this level
+    Returns:
+    - arrays = dict of arrays keyed on the dotted path
+    """
+    arrays = {}
+
+    for name, value in state.items():
+        key = prefix + name
+
+        if isinstance(value, dict):
+            arrays.update(flatten(value, key + '.'))
+            continue
+
+        array = np.asarray(value)
+
+        if array.dtype == object:
+            raise TypeError(f'{key} cannot be stored without pickling')
+
+        arrays[key] = array
+
+    return arrays
+
+
+def unflatten(arrays):
+    """
+    This method rebuilds the nested dict flattened by flatten()
+    """
+    state = {}
+
+    for key, array in arrays.items():
+        *path, name = key.split('.')
+
+        level = state
+        for part in path:
+            level = level.setdefault(part, {})
+
+        level[name] = array
+
+    return state
+
+
+def rng_state():
+    """
+    Returns the state of the global numpy and python random generators
+    """
+    (_, keys, pos, has_gauss, cached_gaussian) = np.random.get_state()
+    (version, internal, gauss_next) = random.getstate()
+
+    return {
+        'numpy': {'keys': keys, 'pos': pos, 'has_gauss': has_gauss, 'cached_gaussian': cached_gaussian},
+        'python': {'version': version, 'internal': np.array(internal, dtype=np.int64),
+                   'gauss_next': np.nan if gauss_next is None else gauss_next},
+    }
+
+
+def set_rng_state(state):
+    """
+    Restores the global random generators from rng_state()
+    """
+    s = state['numpy']
+    np.random.set_state(('MT19937', s['keys'], int(s['pos']), int(s['has_gauss']), float(s['cached_gaussian'])))
+
+    s = state['python']
+    gauss_next = float(s['gauss_next'])
+    random.setstate((int(s['version']), tuple(int(i) for i in s['internal']),
+                     None if np.isnan(gauss_next) else gauss_next))
+
+
+def save(path, state):
+    """
+    This method writes a state to an uncompressed .npz file. The file is
+    written next to its destination and renamed over it, so a crash
+    leaves either the previous checkpoint or the new one
+    Args:
+    - path = checkpoint file
+    - state = nested dict of arrays, see flatten()
+    """
+    arrays = flatten(state)
+    arrays['version'] = np.array(VERSION)
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.replace(tmp, path)
+
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def load(path):
+    """
+    This method reads a state written by save()
+    """
+
+    with np.load(path, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+
+    version = int(arrays.pop('version'))
+
+    if version != VERSION:
+        raise ValueError(f'Checkpoint version {version} is not supported (expected {VERSION})')
+
+    return unflatten(arrays)
@@ -0,0 +1,174 @@
+import numpy as np
+
+import profiling
+
+try:
+    from soa import signalprocessing
+except ImportError:
+    # only needed for cost functions without a kernel below
+    signalprocessing = None
+
+
+def _mean_squared_error(t, PV, st_importance_factor, SP):
+
+    # one temporary for the whole population, squared in place
+    d = np.subtract(PV, SP)
+    np.square(d, out=d)
+
+    return d.sum(axis=-1) / d.shape[-1]
+
+
+# cost functions of signalprocessing.cost evaluated over whole arrays,
+# any other cost_function_label falls back to one cost object per signal.
+# Each kernel maps (t, (particles x q x samples) PV, st_importance_factor,
+# (q x samples) SP) to the (particles x q) costs
+KERNELS = {
+    'mSE': _mean_squared_error,
+}
+
+
+@profiling.timed('cost_eval.stage_costs')
+def stage_costs(t, PV, cost_f, st_importance_factor, SP):
+    """
+    This method evaluates the cost of every SOA output of a population
+    Args:
+    - t = time signal array passed to signalprocessing.cost
+    - PV = (particles x q x samples) output signals
+    - cost_f = cost function label
+    - st_importance_factor = settling time importance factor
+    - SP = set points, one per SOA
+    Returns:
+    - costs = (particles x q) cost of each SOA output
+    """
+    PV = np.asarray(PV)
+
+    if cost_f in KERNELS:
+        # one set point per SOA, a signal or a constant level
+        SP = np.asarray(SP, dtype=float)[:PV.shape[1]].reshape(PV.shape[1], -1)
+        return KERNELS[cost_f](t, PV, st_importance_factor, SP)
+
+    return reference_costs(t, PV, cost_f, st_importance_factor, SP)
+
+
+def reference_costs(t, PV, cost_f, st_importance_factor, SP):
+    """
+    This method evaluates stage_costs() with one signalprocessing.cost
+    object per SOA output, the definition the kernels must reproduce
+    """
+
+    if signalprocessing is None:
+        raise ImportError(f'soa.signalprocessing is needed for cost function {cost_f}')
+
+    PV = np.asarray(PV)
+    fitness = np.zeros(PV.shape[:2])
+
+    for i in range(PV.shape[0]):
+        for j in range(PV.shape[1]):
+            fitness[i, j] = signalprocessing.cost(t,
+                                            PV[i, j],
+                                            cost_function_label=cost_f,
+                                            st_importance_factor=st_importance_factor,
+                                            SP=SP[j]).costEval
+
+    return fitness
+
+
+def register_kernel(cost_f, kernel, bound = None):
+    """
+    This method adds a vectorised cost function, its costs must match
+    reference_costs()
+    Args:
+    - cost_f = cost_function_label it replaces
+    - kernel = function(t, PV, st_importance_factor, SP), see KERNELS
+    - bound = optional running lower bound class for early termination,
+    see mse_bound
+    """
+
+    KERNELS[cost_f] = kernel
+
+    if bound is not None:
+        BOUNDS[cost_f] = bound
+
+
+def batch_cost(t, PV, cost_f, st_importance_factor, SP):
+    """
+    This method evaluates the cost of a population of cascaded SOA outputs
+    Args:
+    - as stage_costs()
+    Returns:
+    - costs = (particles,) cost summed over the SOAs
+    """
+
+    return stage_costs(t, PV, cost_f, st_importance_factor, SP).sum(axis=1)
+
+
+class mse_bound:
+
+    def __init__(self, rows, points):
+        '''
+        Running lower bound of the mSE of one SOA output that arrives a block
+        of samples at a time, before the offset correction is known
+
+        The final output is y + c with c = max(0, -min(y)), and the running
+        minimum only falls, so c >= c_k for the samples seen so far. The
+        squared error of those samples, minimised over c >= c_k, can only
+        grow as more samples arrive, which makes it a valid lower bound.
+        Statistics are merged per block (Chan et al.) to avoid cancellation.
+
+        Parameters:
+        - rows: number of signals tracked
+        - points: number of samples of the complete output
+        '''
+
+        self.points = points
+
+        self.count = 0
+        self.mean = np.zeros(rows)
+        self.M2 = np.zeros(rows)
+        self.y_min = np.full(rows, np.inf)
+
+
+    def update(self, y, SP):
+        """
+        Adds a (rows x block) block of raw outputs and its set point
+        """
+        d = y - SP
+
+        n_b = d.shape[1]
+        mean_b = d.mean(axis=1)
+        M2_b = np.square(d - mean_b[:, None]).sum(axis=1)
+
+        delta = mean_b - self.mean
+        count = self.count + n_b
+
+        self.mean = self.mean + delta * n_b / count
+        self.M2 = self.M2 + M2_b + np.square(delta) * self.count * n_b / count
+        self.count = count
+
+        self.y_min = np.minimum(self.y_min, y.min(axis=1))
+
+
+    def lower(self):
+        """
+        Returns the (rows,) lower bound of the mSE of the complete output
+        """
+        c = np.maximum(np.maximum(-self.y_min, 0), -self.mean)
+
+        return (self.M2 + self.count * np.square(self.mean + c)) / self.points
+
+
+    def take(self, keep):
+        """
+        Keeps the rows selected by the boolean or index array keep
+        """
+
+        self.mean = self.mean[keep]
+        self.M2 = self.M2[keep]
+        self.y_min = self.y_min[keep]
+
+
+# cost functions with a running lower bound, so evaluations can stop once
+# a signal is known to lose
+BOUNDS = {
+    'mSE': mse_bound,
+}
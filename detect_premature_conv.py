@@ -1,27 +1,106 @@
-  def detect_regroup(self, x, pbest, pbest_value, gbest, gbest_cost, gbest_cost_history, curr_iter):
-      """
-      This method determines if regrouping is required to avoid premature convergence
+import numpy as np
 
-      Args:
-      - Particle Positions
-      - Global Best Position
-      - Current Iteration
+import checkpoint
 
-      Returns
-      - True if Regrouping is required
-      """
-      for i in range(0, self.n):
 
-          distance = np.linalg.norm(x[i]-gbest)/self.num_points
+def swarm_radius(x, gbest, num_points):
+    """
+    This method calculates the swarm radius, the largest distance of a
+    particle from gbest normalised by the signal length
 
-          if distance > self.swarm_radius[curr_iter - 1]:
-              self.swarm_radius[curr_iter - 1] = distance
+    Args:
+    - x = (n x m_c) particle positions
+    - gbest = global best position
+    - num_points = number of points of the control signal
 
-      self.d_norm[curr_iter - 1] = self.swarm_radius[curr_iter - 1]/(self.max_val - self.min_val)
+    Returns:
+    - radius
+    """
 
+    return np.max(np.linalg.norm(x - gbest, axis=1)) / num_points
 
-      if self.d_norm[curr_iter - 1] < 6e-3/self.r:
-          print('Chaotic Search Started')
-          self.chaotic_search( x, pbest, pbest_value, gbest, gbest_cost, gbest_cost_history, curr_iter)
-          self.r = self.r * np.exp
-          print('Chaotic Mapping Performed')
+
+class detect_premature_conv(checkpoint.stateful):
+
+    # attributes saved by checkpoints
+    STATE = ('r', 'swarm_radius', 'd_norm')
+
+    def __init__(self, num_points, iter_max, min_val = -1.0, max_val = 1.0, threshold = 6e-3, r = 1.0, r_growth = np.e):
+        '''
+        Detection of premature convergence from the normalised swarm radius
+
+        Parameters:
+        - num_points: number of points of the control signal
+        - iter_max: number of iterations to keep statistics for
+        - min/max_val: position boundaries
+        - threshold: normalised radius under which the swarm has converged
+        - r: initial divisor of the threshold
+        - r_growth: factor r grows by after each detection, so the swarm
+          must shrink further before the next one
+        '''
+
+        self.num_points = num_points
+        self.min_val = min_val
+        self.max_val = max_val
+        self.threshold = threshold
+        self.r = r
+        self.r_growth = r_growth
+
+        self.swarm_radius = np.zeros(iter_max)
+        self.d_norm = np.zeros(iter_max)
+
+
+
+    def detect_regroup(self, x, gbest, curr_iter):
+        """
+        This method determines if regrouping is required to avoid premature convergence
+
+        Args:
+        - x = particle positions
+        - gbest = global best position
+        - curr_iter = current iteration, from 1
+
+        Returns:
+        - True if regrouping (or a chaotic search) is required
+        """
+
+        i = curr_iter - 1
+
+        self.swarm_radius[i] = max(self.swarm_radius[i], swarm_radius(x, gbest, self.num_points))
+
+        self.d_norm[i] = self.swarm_radius[i] / (self.max_val - self.min_val)
+
+        if self.d_norm[i] < self.threshold / self.r:
+            self.r = self.r * self.r_growth
+            return True
+
+        return False
+
+
+    def detect_stagnation(self, gbest_cost_history, curr_iter, window, radius = np.inf, rtol = 0.0):
+        """
+        This method determines if the run has stagnated: over the last window
+        iterations the normalised swarm radius stayed under radius and gbest
+        improved by no more than rtol relative
+
+        Args:
+        - gbest_cost_history = gbest cost before the first iteration and
+          after every iteration since
+        - curr_iter = current iteration, from 1
+        - window = iterations looked back
+        - radius = normalised radius (d_norm) the swarm must stay under
+        - rtol = relative improvement that still counts as progress
+
+        Returns:
+        - True if the run has stagnated
+        """
+
+        if curr_iter < window:
+            return False
+
+        if self.d_norm[curr_iter - window:curr_iter].max() >= radius:
+            return False
+
+        before, after = gbest_cost_history[-window - 1], gbest_cost_history[-1]
+
+        return before - after <= rtol * before
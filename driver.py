@@ -0,0 +1,478 @@
+import random
+
+import logging
+import math
+
+import numpy as np
+
+import budget
+import checkpoint
+import detect_premature_conv
+import evolved_psos
+import history
+import profiling
+import regroup
+import response
+import soa_engine
+
+
+logger = logging.getLogger(__name__)
+
+# profiling sections credited with the improvements of each operator
+SECTIONS = {'cpso': 'cpso.partition', 'chaos': 'chaos.cls', 'ol': 'ol.evaluate'}
+
+# soa_engine counters saved by checkpoints
+ENGINE_COUNTERS = ('evaluations', 'rejections', 'stage_evaluations', 'coarse_evaluations', 'screened')
+
+# soa_engine caches saved by checkpoints
+ENGINE_CACHES = ('cache', 'stage_cache')
+
+
+class hybrid_pso:
+
+    def __init__(self,
+                n,
+                m,
+                q,
+                sim_model,
+                t2,
+                X0,
+                cost_f,
+                st_importance_factor,
+                SP,
+                iter_max = 50,
+                min_val = -1.0,
+                max_val = 1.0,
+                c1_min = 0.5,
+                c1_max = 2.0,
+                c2_min = 0.5,
+                c2_max = 2.0,
+                w_init = 0.9,
+                w_final = 0.4,
+                use_chaos = True,
+                use_ol = True,
+                use_regroup = True,
+                map_type = 'logistic',
+                rep = 50,
+                surrogate = None,
+                explore = 4,
+                scheduler = None,
+                rho = 1.2,
+                lmd = 0.1,
+                threshold = 6e-3,
+                seed = None,
+                backend = 'foh',
+                fidelity = None,
+                engine = None,
+                checkpoint_path = None,
+                checkpoint_every = 5,
+                history_path = None,
+                log_interval = 1.0,
+                profile = False,
+                time_limit = None,
+                max_evaluations = None,
+                stagnation_window = None,
+                stagnation_radius = math.inf,
+                stagnation_rtol = 0.0):
+        '''
+        Cooperative PSO run with chaotic search or regrouping when the swarm
+        converges prematurely, and orthogonal learning of the context vector
+
+        Parameters:
+        - n, m, q, sim_model, t2, X0, cost_f, st_importance_factor, SP: as
+          evolved_psos.cpso_sk
+        - iter_max: number of iterations of run()
+        - min/max_val: position boundaries
+        - c1/c2_min/max, w_init/final: CPSO coefficients
+        - use_chaos/ol/regroup: optional stages of an iteration
+        - map_type, rep: chaotic search parameters
+        - surrogate, explore: surrogate pre-screening of the chaotic search
+          candidates, see evolved_psos.chaos
+        - scheduler: optional scheduler.bandit deciding each iteration
+          whether orthogonal learning runs and how many repetitions a
+          chaotic search gets, in place of the fixed rep budget
+        - rho, lmd: regrouping parameters
+        - threshold: normalised swarm radius of premature convergence
+        - seed: seeds the global numpy and python generators and regrouping
+        - backend: simulation backend, see soa_engine.BACKENDS
+        - fidelity: coarse grid screening of the CPSO moves and chaotic
+          search candidates, see soa_engine. Orthogonal learning averages
+          every combination it evaluates, so it stays at full resolution
+        - engine: soa_engine shared by every optimiser, built if not given
+        - checkpoint_path: file run() saves the state to, none if None
+        - checkpoint_every: iterations between two checkpoints
+        - history_path: memory-mapped file of the per-iteration history,
+          kept in memory if None
+        - log_interval: seconds between two progress messages
+        - profile: collect per-section timings and evaluations during run(),
+          see profiling. The summary is kept in self.profile_summary and logged
+        - time_limit, max_evaluations: budget of run() in seconds and full
+          resolution evaluations, see budget. Every optimiser stops between
+          two evaluations once it is spent
+        - stagnation_window/radius/rtol: run() also stops once the swarm
+          stayed under stagnation_radius without improving gbest by more than
+          stagnation_rtol for stagnation_window iterations, see
+          detect_premature_conv.detect_stagnation. Not checked if the window
+          is None
+        '''
+
+        self.n = n
+        self.m = m
+        self.q = q
+        self.m_c = self.m * self.q
+        self.iter_max = iter_max
+        self.min_val = min_val
+        self.max_val = max_val
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_every = checkpoint_every
+        self.profile = profile
+        self.profile_summary = None
+        self.stagnation_window = stagnation_window
+        self.stagnation_radius = stagnation_radius
+        self.stagnation_rtol = stagnation_rtol
+
+        # why the last run() stopped
+        self.stop_reason = None
+
+        if seed is not None:
+            np.random.seed(seed)
+            random.seed(seed)
+
+        if engine is None:
+            engine = soa_engine.soa_engine(sim_model, t2, X0, m, q, cost_f, st_importance_factor, SP, backend=backend,
+                                           fidelity=fidelity)
+        self.engine = engine
+
+        if time_limit is not None or max_evaluations is not None:
+            self.engine.budget = budget.budget(time_limit, max_evaluations)
+
+        common = dict(m=m, q=q, sim_model=sim_model, t2=t2, X0=X0, cost_f=cost_f,
+                      st_importance_factor=st_importance_factor, SP=SP, engine=engine)
+
+        x = np.random.uniform(min_val, max_val, (n, self.m_c))
+        v = np.random.uniform(-0.05 * max_val, 0.05 * max_val, (n, self.m_c))
+
+        costs = self.engine.evaluate_batch(x)
+        gbest = np.copy(x[np.argmin(costs)])
+
+        self.cpso = evolved_psos.cpso_sk(n, x=x, x_value=None, pbest=np.copy(x), pbest_value=None, gbest=gbest,
+                                         v=v, c1_min=c1_min, c1_max=c1_max, c2_min=c2_min, c2_max=c2_max,
+                                         w_init=w_init, w_final=w_final, **common)
+
+        self.chaos = evolved_psos.chaos(n, map_type=map_type, min_val=min_val, max_val=max_val, rep=rep,
+                                        surrogate=surrogate, explore=explore, **common) if use_chaos else None
+
+        self.ol = evolved_psos.ol(**common) if use_ol else None
+
+        self.scheduler = scheduler
+
+        self.regroup = regroup.regroup(n, self.m_c, rho, lmd, min_val, max_val, rng=seed) if use_regroup else None
+
+        self.detector = detect_premature_conv.detect_premature_conv(self.m_c, iter_max, min_val, max_val,
+                                                                    threshold=threshold)
+
+        self.iteration = 0
+        self.gbest_cost_history = [self.cpso.context_cost]
+
+        self.history = history.history(iter_max, path=history_path, log_interval=log_interval)
+
+
+    @property
+    def gbest(self):
+
+        return self.cpso.context
+
+
+    @property
+    def gbest_cost(self):
+
+        return self.cpso.context_cost
+
+
+    def step(self):
+        """
+        This method runs one iteration: a CPSO sweep, then a chaotic search
+        (or regrouping) if the swarm has converged, then orthogonal learning.
+        Once the budget of the engine is spent the remaining stages are
+        skipped
+        """
+        c = self.cpso
+
+        self.iteration += 1
+
+        events = 0
+
+        start = (c.context_cost, self.engine.evaluations)
+        c.partition()
+        self.__credit('cpso', *start)
+
+        detected = self.detector.detect_regroup(c.x, c.context, self.iteration)
+
+        if detected and self.engine.exhausted() is None:
+
+            if self.chaos is not None and self.scheduler is not None:
+                self.chaos.rep = self.scheduler.budget('chaos', self.iteration)
+
+            if self.chaos is not None and self.chaos.rep > 0:
+                start = (c.context_cost, self.engine.evaluations)
+                self.__chaotic_search()
+                self.__credit('chaos', *start)
+                events |= history.CHAOS
+
+            elif self.regroup is not None:
+                self.__regroup()
+                events |= history.REGROUP
+
+        if self.ol is not None and self.engine.exhausted() is None \
+                and (self.scheduler is None or self.scheduler.budget('ol', self.iteration)):
+            start = (c.context_cost, self.engine.evaluations)
+
+            if self.__orthogonal_learning():
+                events |= history.OL
+
+            self.__credit('ol', *start)
+
+        self.gbest_cost_history.append(c.context_cost)
+
+        self.history.record(self.iteration, c.context_cost, self.detector.swarm_radius[self.iteration - 1],
+                            self.engine.evaluations, events)
+
+
+    def __credit(self, operator, cost, evaluations):
+        # credits the gbest cost reduction since cost, and the evaluations
+        # since evaluations, to an operator
+
+        profiling.PROFILER.improved(SECTIONS[operator], cost - self.cpso.context_cost)
+
+        if self.scheduler is not None:
+            self.scheduler.observe(operator, cost, self.cpso.context_cost, self.engine.evaluations - evaluations)
+
+
+    def __chaotic_search(self):
+
+        c = self.cpso
+
+        x_value = self.engine.evaluate_batch(c.x)
+        pbest_value = self.engine.evaluate_batch(c.pbest)
+
+        (x, x_value, pbest, pbest_value, gbest, _, achieved) = self.chaos.cls(c.x, x_value, c.pbest, pbest_value,
+                                                                               np.copy(c.context), c.context_cost,
+                                                                               self.gbest_cost_history)
+
+        c.x, c.pbest = x, pbest
+        c.x_value, c.pbest_value = c.cascade(x_value), c.cascade(pbest_value)
+
+        # chaos only copies the first slice of its best candidate into gbest
+        if achieved:
+            cost = self.engine.get_cost(gbest)
+
+            if cost < c.context_cost:
+                c.context, c.context_cost = gbest, cost
+
+
+    def __regroup(self):
+
+        c = self.cpso
+        r = self.regroup
+
+        r.regroup(c.x, c.context, c.v)
+
+        c.LB = np.maximum(r.LB, self.min_val)
+        c.UB = np.minimum(r.UB, self.max_val)
+        c.v_LB, c.v_UB = r.v_LB, r.v_UB
+
+        np.clip(c.x, c.LB, c.UB, out=c.x)
+
+        c.x_value = c.cascade(self.engine.evaluate_batch(c.x))
+
+
+    def __orthogonal_learning(self):
+        # True if the guide particle improved the context vector
+
+        c = self.cpso
+
+        # particle with the best personal best over its SOA moves
+        j = np.argmin(c.pbest_value.min(axis=0))
+
+        guide = self.ol.evaluate(c.pbest[j], c.context)
+        cost = self.engine.get_cost(guide)
+
+        if cost < c.context_cost:
+            c.context, c.context_cost = np.copy(guide), cost
+            return True
+
+        return False
+
+
+    def run(self):
+        """
+        This method iterates until iter_max, or until the budget is spent or
+        the run stagnates, saving a checkpoint every checkpoint_every
+        iterations and at the end. Either way the best signal so far is
+        returned, see result() for its step response and stop_reason
+        Returns:
+        - gbest, gbest_cost
+        """
+        profiler = profiling.PROFILER
+
+        if self.profile:
+            profiler.reset()
+            profiler.enable(counter=lambda: self.engine.evaluations)
+
+        if self.engine.budget is not None:
+            self.engine.budget.start()
+
+        self.stop_reason = None
+
+        try:
+            while self.iteration < self.iter_max:
+                self.stop_reason = self.__stop_reason()
+
+                if self.stop_reason is not None:
+                    logger.info('stopped at iteration %d: %s', self.iteration, self.stop_reason)
+
+                    if self.checkpoint_path is not None:
+                        self.save(self.checkpoint_path)
+
+                    break
+
+                self.step()
+
+                if self.checkpoint_path is not None and (self.iteration % self.checkpoint_every == 0
+                                                         or self.iteration == self.iter_max):
+                    self.save(self.checkpoint_path)
+
+        finally:
+            if self.profile:
+                profiler.disable()
+                self.profile_summary = profiler.summary()
+                logger.info('profile of the run:\n%s', profiler.report())
+
+        self.history.flush()
+
+        self.stop_reason = self.stop_reason or 'iter_max'
+
+        return self.gbest, self.gbest_cost
+
+
+    def __stop_reason(self):
+        # spent budget or stagnation, None to go on
+
+        reason = self.engine.exhausted()
+
+        if reason is None and self.stagnation_window is not None \
+                and self.detector.detect_stagnation(self.gbest_cost_history, self.iteration, self.stagnation_window,
+                                                    self.stagnation_radius, self.stagnation_rtol):
+            reason = 'stagnation'
+
+        return reason
+
+
+    def result(self):
+        """
+        Returns the best drive signal so far as a dict of gbest, gbest_cost,
+        the rise_time, settling_time, overshoot and settling_index of every
+        SOA output (see response.measure, settling counted from the set
+        point step), the output PV of the last SOA and its time grid t,
+        iterations, evaluations, elapsed seconds and stop_reason of the
+        last run()
+        """
+        T = self.engine.T
+
+        # settling time counts from the step of the set point
+        SP = self.engine.SP[-1]
+        t_step = T[np.argmax(SP != SP[0])]
+
+        PV = self.engine.outputs(self.gbest)[0]
+
+        (rt, st, os_, st_index) = response.measure(PV, T, t_step=t_step)
+
+        elapsed = self.history.columns()['elapsed']
+
+        return dict(gbest=np.copy(self.gbest), gbest_cost=float(self.gbest_cost), rise_time=rt,
+                    settling_time=st, overshoot=os_, settling_index=st_index, PV=PV[-1], t=T,
+                    iterations=self.iteration, evaluations=self.engine.evaluations,
+                    elapsed=float(elapsed[-1]) if elapsed.size else 0.0, stop_reason=self.stop_reason)
+
+
+    def state_dict(self):
+        """
+        Returns the state of the run, of every optimiser and of the random
+        generators
+        """
+        state = {
+            'iteration': self.iteration,
+            'gbest_cost_history': np.array(self.gbest_cost_history),
+            'cpso': self.cpso.state_dict(),
+            'detector': self.detector.state_dict(),
+            'history': self.history.state_dict(),
+            'engine': {name: getattr(self.engine, name) for name in ENGINE_COUNTERS},
+            'rng': checkpoint.rng_state(),
+        }
+
+        if self.chaos is not None:
+            state['chaos'] = self.chaos.state_dict()
+
+        if self.regroup is not None:
+            state['regroup'] = self.regroup.state_dict()
+
+        if self.scheduler is not None:
+            state['scheduler'] = self.scheduler.state_dict()
+
+        # a cache that rounds signals changes the costs a run sees, so it is
+        # saved for the resume to stay exact
+        for name in ENGINE_CACHES:
+            if getattr(self.engine, name) is not None:
+                state[name] = getattr(self.engine, name).state_dict()
+
+        return state
+
+
+    def load_state_dict(self, state):
+        """
+        Restores the state returned by state_dict, the run then continues
+        exactly as it would have without the interruption
+        """
+
+        self.iteration = int(state['iteration'])
+        self.gbest_cost_history = list(state['gbest_cost_history'])
+
+        self.cpso.load_state_dict(state['cpso'])
+        self.detector.load_state_dict(state['detector'])
+        self.history.load_state_dict(state['history'])
+
+        for name, value in state['engine'].items():
+            setattr(self.engine, name, int(value))
+
+        if self.chaos is not None:
+            self.chaos.load_state_dict(state['chaos'])
+
+        if self.regroup is not None:
+            self.regroup.load_state_dict(state['regroup'])
+
+        # a run checkpointed without a scheduler resumes with a fresh one
+        if self.scheduler is not None and state.get('scheduler') is not None:
+            self.scheduler.load_state_dict(state['scheduler'])
+
+        for name in ENGINE_CACHES:
+            if getattr(self.engine, name) is not None and name in state:
+                getattr(self.engine, name).load_state_dict(state[name])
+
+        checkpoint.set_rng_state(state['rng'])
+
+
+    def save(self, path):
+        """
+        Writes a checkpoint of the run, see checkpoint.save
+        """
+
+        checkpoint.save(path, self.state_dict())
+
+
+    def load(self, path):
+        """
+        Resumes from a checkpoint written by save. The optimiser must have
+        been built with the same parameters
+        """
+
+        self.load_state_dict(checkpoint.load(path))
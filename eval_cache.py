@@ -0,0 +1,140 @@
+import collections
+import hashlib
+
+import numpy as np
+
+
+# bytes of a key
+DIGEST_SIZE = 16
+
+
+class cost_cache:
+
+    def __init__(self, maxsize = 100000, decimals = None):
+        '''
+        LRU cache of costs keyed on the drive signal that produced them. Also
+        used per SOA by the engine, keyed on one slice of the signal
+
+        Parameters:
+        - maxsize: maximum number of stored costs, least recently used
+          ones are evicted first
+        - decimals: if given, signals are rounded to this many decimals
+          before hashing so near-identical signals share one entry
+        '''
+
+        self.maxsize = maxsize
+        self.decimals = decimals
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self.__costs = collections.OrderedDict()
+
+
+    def key(self, p, stage = None, config = b''):
+        """
+        This method returns the canonical hash of a drive signal
+        Args:
+        - p = drive signal, or the slice of one SOA
+        - stage = index of the SOA the slice drives, so equal slices of
+        different SOAs get different keys
+        - config = digest (at most 64 bytes) of everything else the cost
+        depends on, see soa_engine.fingerprint, so engines with different
+        configurations can share one cache
+        Returns:
+        - key = digest of the (optionally quantised) float64 signal
+        """
+        p = np.ascontiguousarray(p, dtype=float)
+
+        if self.decimals is not None:
+            # adding 0.0 folds -0.0 into 0.0
+            p = np.round(p, self.decimals) + 0.0
+
+        person = b'' if stage is None else b'stage%d' % stage
+
+        return hashlib.blake2b(p.tobytes(), digest_size=DIGEST_SIZE, key=config, person=person).digest()
+
+
+    def get(self, key):
+        """
+        Returns the cost stored under key or None, counting the hit or miss
+        """
+
+        cost = self.__costs.get(key)
+
+        if cost is None:
+            self.misses += 1
+            return None
+
+        self.__costs.move_to_end(key)
+        self.hits += 1
+
+        return cost
+
+
+    def put(self, key, cost):
+        """
+        Stores a cost, evicting the least recently used one when full
+        """
+
+        self.__costs[key] = cost
+        self.__costs.move_to_end(key)
+
+        while len(self.__costs) > self.maxsize:
+            self.__costs.popitem(last=False)
+            self.evictions += 1
+
+
+    def clear(self):
+        """
+        Empties the cache and resets its counters
+        """
+
+        self.__costs.clear()
+        self.hits = self.misses = self.evictions = 0
+
+
+    def state_dict(self):
+        """
+        Returns the keys (one row of digest bytes each) and costs in LRU
+        order, and the counters
+        """
+        keys = b''.join(self.__costs)
+
+        return {
+            'keys': np.frombuffer(keys, dtype=np.uint8).reshape(-1, DIGEST_SIZE),
+            'costs': np.array(list(self.__costs.values()), dtype=float),
+            'counters': np.array([self.hits, self.misses, self.evictions]),
+        }
+
+
+    def load_state_dict(self, state):
+        """
+        Restores the state returned by state_dict
+        """
+
+        keys = np.asarray(state['keys'], dtype=np.uint8)
+
+        self.__costs = collections.OrderedDict((key.tobytes(), float(cost)) for key, cost in zip(keys, state['costs']))
+        self.hits, self.misses, self.evictions = (int(count) for count in state['counters'])
+
+
+    def stats(self):
+        """
+        Returns hits, misses, hit rate, evictions and current size
+        """
+        lookups = self.hits + self.misses
+
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'size': len(self.__costs),
+        }
+
+
+    def __len__(self):
+
+        return len(self.__costs)
@@ -1,14 +1,21 @@
-from matplotlib.pyplot import xcorr
+import logging
 import numpy as np
 import random
 import math
 
-from soa import optimisation
-from soa import devices, signalprocessing, analyse, distort_tf
-from soa import upsampling
-from scipy import signal 
+import checkpoint
+import profiling
+import soa_engine
 
-class chaos:
+
+# improvements found by the optimisers, DEBUG for per-call detail. The
+# periodic progress lines of a run come from history, at log_interval
+logger = logging.getLogger(__name__)
+
+class chaos(checkpoint.stateful):
+
+    # attributes saved by checkpoints
+    STATE = ('LB', 'UB', 'rep', 'a')
 
     def __init__(self, 
                 n,
@@ -24,7 +31,14 @@ class chaos:
                 change_range = False,
                 min_val = - 1.0,
                 max_val = 1.0, 
-                rep = 50):
+                rep = 50,
+                backend = 'foh',
+                executor = 'serial',
+                workers = None,
+                engine = None,
+                surrogate = None,
+                explore = 4,
+                lookahead = None):
         '''
         Chaos Optimization PSO
         
@@ -40,6 +54,21 @@ class chaos:
         - change_range: boolean to determine if range will be changed
         - map_type: selection of map type as string: tent or logistic map
         - rep: number of initial repetitions
+        - backend: simulation backend, see soa_engine.BACKENDS
+        - executor/workers: parallel evaluation of batches, see soa_engine
+        - engine: soa_engine shared with other optimisers, built from the
+          parameters above if not given
+        - surrogate: optional model of the cost (e.g. surrogate.rbf_surrogate)
+          fitted on every true evaluation of the search. Each search then
+          draws explore times as many chaotic candidates as repetitions and
+          simulates the best predicted ones, rep simulations in all
+        - explore: candidates drawn per repetition when a surrogate is used
+        - lookahead: most candidates simulated in one batch. Those after the
+          first assume the best particle and gbest do not change, and an
+          update only simulates again the ones it altered. Batches start at
+          one candidate, double while no update cuts them short and halve
+          when one does. Unbounded if None and the engine batches cheaply
+          (see soa_engine.batched), one at a time otherwise
         '''
         
         self.n = n
@@ -68,9 +97,44 @@ class chaos:
         self.map_type = map_type
         self.rep = rep
 
+        if engine is None:
+            engine = soa_engine.soa_engine(sim_model, t2, X0, m, q, cost_f, st_importance_factor, SP, backend=backend,
+                                           executor=executor, workers=workers)
+        self.engine = engine
+
+        self.surrogate = surrogate
+        self.explore = explore if surrogate is not None else 1
+
+        self.lookahead = lookahead
+
         self.a = 0.7
 
 
+    def state_dict(self):
+        """
+        Returns the state that changes during a run, as arrays
+        """
+
+        state = super().state_dict()
+
+        if self.surrogate is not None:
+            state['surrogate'] = self.surrogate.state_dict()
+
+        return state
+
+
+    def load_state_dict(self, state):
+        """
+        Restores the state returned by state_dict
+        """
+
+        super().load_state_dict(state)
+
+        if self.surrogate is not None:
+            self.surrogate.load_state_dict(state['surrogate'])
+
+
+    @profiling.timed('chaos.cls')
     def cls(self, x, x_value, pbest, pbest_value, gbest, gbest_cost, gbest_cost_history):
         
         dummy = np.tile(gbest, (self.n, 1))
@@ -84,73 +148,137 @@ class chaos:
         # Criterion that new gbest was found
         achieved = False
 
+        # Logistic Mapping/Tent Mapping and Random Cascaded SOAs for every
+        # candidate, drawn up front so candidates can be built in advance.
+        # Without a surrogate there is one candidate per repetition
+        pool = self.rep * self.explore
+
+        cs = np.random.randint(low = 0, high = self.q, size = pool)
+        zs = self.sequence(z, pool)
+
+        # SOA of each column, a candidate only changes the columns of its SOA
+        columns = np.arange(self.m_c) // self.m
+
+        # candidates not used yet
+        unused = np.ones(pool, dtype=bool)
+
+        # last simulated version of every candidate and its cost, so a
+        # candidate built the same way after an update is not simulated again
+        built = np.full((pool, self.m_c), np.nan)
+        known = np.full(pool, np.nan)
+
+        # candidates per batch, doubled up to the lookahead while the best
+        # particle holds and halved when it changes under a batch
+        lookahead = self.lookahead or (pool if self.engine.batched() else 1)
+        width, dropped = 1, None
+
+        if self.surrogate is not None:
+            self.surrogate.observe(x, x_value)
+            self.surrogate.observe(pbest, pbest_value)
+
+        i = 0
+
         # Chaotic Search Using Tent Mapping
-        for i in range(0, self.rep):
+        while i < self.rep and self.engine.exhausted() is None:
             
             # Get the best particle
-            p = np.copy(dummy[np.argsort(dummy_value)[0]])
-            
-            # Random Cascaded SOAs
-            c = np.random.randint(low = 0, high = 2)
-            
-            # Logistic Mapping/Tent Mapping
-            z = self.mapping(z)
+            best = np.copy(dummy[np.argsort(dummy_value)[0]])
+
+            # Randomize part of particle using chaotic mapping for every
+            # remaining candidate. The candidates stay valid until the best
+            # particle, gbest or the range change
+            order = np.flatnonzero(unused)
+            candidates = np.where(columns == cs[order, None], (self.scale(zs[order]) + gbest) / 2.0, best)
+
+            # the remaining repetitions go to the best predicted candidates
+            predicted = None if self.surrogate is None else self.surrogate.predict(candidates)
+            pick = slice(0, self.rep - i) if predicted is None else np.argsort(predicted, kind='stable')[:self.rep - i]
+
+            if dropped is not None:
+                width = max(width // 2, 1) if dropped else min(2 * width, lookahead)
+
+            # the next candidates are simulated in one batch, except those
+            # an update left as they were
+            order, candidates = order[pick][:width], candidates[pick][:width]
 
-            # Randomize part of particle using chaotic mapping
-            for g in range(c*self.m, (c+1)*self.m):      
-                p[g] = (np.interp(z[g], [0, 1], [self.LB[g], self.UB[g]]) + gbest[g]) / 2.0
+            dropped = False
+
+            stale = np.any(built[order] != candidates, axis = 1)
             
-            # Get and Evaluate Output
-            fitness[i] = self.get_cost(p)
+            # Get and Evaluate Outputs. A candidate can only be kept if it
+            # beats the worst stored particle or gbest, and neither bound
+            # rises while the candidates are processed
+            if stale.any():
+                threshold = max(np.max(dummy_value), gbest_cost)
+
+                built[order[stale]] = candidates[stale]
+                known[order[stale]] = self.evaluate_batch(candidates[stale], threshold)
+
+                if self.surrogate is not None:
+                    self.surrogate.observe(candidates[stale], known[order[stale]])
+
+            for row, p in zip(order, candidates):
+
+                unused[row] = False
+
+                fitness[i] = known[row]
 
-            # Select Worst particle to change
-            idx = np.argsort(dummy_value)[-1]
+                changed = False
+
+                # Select Worst particle to change
+                idx = np.argsort(dummy_value)[-1]
             
-            # change it if new cost is lower
-            if dummy_value[idx] > fitness[i]:
+                # change it if new cost is lower
+                if dummy_value[idx] > fitness[i]:
 
-                dummy_value[idx] = fitness[i]
+                    # the best particle changes
+                    changed = fitness[i] <= np.min(dummy_value)
 
-                for g in range(0, self.m_c):
+                    dummy_value[idx] = fitness[i]
 
-                    dummy[idx, g] = p[g]
+                    dummy[idx] = p
 
 
-            # Condition for better gbest/Break if found
-            if fitness[i] < gbest_cost:
+                # Condition for better gbest/Break if found
+                if fitness[i] < gbest_cost:
                 
-                achieved = True
+                    achieved = True
+
+                    changed = True
                 
-                #update global best, personal best and current position for one aprticle
-                for g in range(0, self.m):
-                    gbest[g] = p[g]
-                    pbest[0, g] = p[g]
-                    x[0, g] = p[g]
+                    #update global best, personal best and current position for one aprticle
+                    g = slice(0, self.m)
+
+                    gbest[g] = pbest[0, g] = x[0, g] = p[g]
                 
-                tmp = np.copy(self.LB)
+                    tmp = np.copy(self.LB)
                 
-                # change range for current CPSO iteration
-                if self.change_range:
-                    # determines how much the range should be limited
-                    self.a = self.a * (1- (gbest_cost_history[-1] - gbest_cost) / gbest_cost_history[-1])
-                    for g in range(0, self.m):
-                        self.LB[g] = max(self.LB[g], gbest[g] - self.a * (self.UB[g] - self.LB[g]))
-                        self.UB[g] = min(self.UB[g], gbest[g] + self.a * (self.UB[g] - self.LB[g]))
+                    # change range for current CPSO iteration
+                    if self.change_range:
+                        # determines how much the range should be limited
+                        self.a = self.a * (1- (gbest_cost_history[-1] - gbest_cost) / gbest_cost_history[-1])
+                        # UB uses the updated LB
+                        self.LB[g] = np.maximum(self.LB[g], gbest[g] - self.a * (self.UB[g] - self.LB[g]))
+                        self.UB[g] = np.minimum(self.UB[g], gbest[g] + self.a * (self.UB[g] - self.LB[g]))
                 
-                print((tmp == self.LB).all())
+                    logger.debug('chaos range unchanged: %s', (tmp == self.LB).all())
                     
-                x_value[0] = fitness[i]
-                pbest_value[0] = fitness[i]  
-                gbest_cost = fitness[i]
+                    x_value[0] = fitness[i]
+                    pbest_value[0] = fitness[i]  
+                    gbest_cost = fitness[i]
                 
-                cost_reduction = ((gbest_cost_history[0] - gbest_cost) \
-                    / gbest_cost_history[0])*100 
+                    cost_reduction = ((gbest_cost_history[0] - gbest_cost) \
+                        / gbest_cost_history[0])*100 
                 
                 
-                print('----------------------------------------------------------')               
-                print(f'Chaos Search Reduced by {cost_reduction} %')
-                print('----------------------------------------------------------')                
-            
+                    logger.info('Chaos Search Reduced by %s %%', cost_reduction)
+
+                i = i + 1
+
+                # build the remaining candidates again
+                if changed:
+                    dropped = row != order[-1]
+                    break
 
         
         (x, x_value, pbest, pbest_value) = self.update(x, x_value, pbest, pbest_value, dummy, dummy_value)
@@ -166,26 +294,52 @@ class chaos:
             z = 4 * z * (1 - z)
         
         elif self.map_type == 'tent':
-            conds = [z < 0.5, z >= 0.5, z == 0]
-            funcs = [lambda z: 2 * z, lambda z: 2 * (1 - z), lambda z: z + random.uniform(0,1)]
-            z = np.piecewise(z, conds, funcs)
+            # the tent map collapses to 0 in floating point, restart from a
+            # random point (one draw shared by every zero)
+            zero = z == 0
+            z = np.where(z < 0.5, 2 * z, 2 * (1 - z))
+
+            if zero.any():
+                z[zero] += random.uniform(0,1)
 
         return z      
+
+
+    def sequence(self, z, length):
+        """
+        This method iterates the chaotic map from z
+        Args:
+        - z = (m_c,) starting point in [0, 1]
+        - length = number of iterations
+        Returns:
+        - (length x m_c) array of the iterates, z excluded
+        """
+        zs = np.empty((length, np.size(z)))
+
+        for i in range(length):
+            z = self.mapping(z)
+            zs[i] = z
+
+        return zs
+
+
+    def scale(self, zs):
+        """
+        This method maps chaotic variables in [0, 1] onto the position
+        range [LB, UB], as np.interp, every row of zs at once
+        """
+
+        return np.where(zs >= 1, self.UB, self.LB + (self.UB - self.LB) * np.maximum(zs, 0))
     
     
     def get_cost(self, p):
 
-        fitness = np.zeros(self.q)
-        
-        PV_chaos = self.__getTransferFunctionOutput(self.sim_model, p, self.t2, self.X0)
-        for i in range(self.q):
-            fitness[i] = signalprocessing.cost(self.t2, 
-                                            PV_chaos[i], 
-                                            cost_function_label=self.cost_f, 
-                                            st_importance_factor=self.st_importance_factor, 
-                                            SP=self.SP[i]).costEval
+        return self.engine.get_cost(p)
+
 
-        return np.sum(fitness)
+    def evaluate_batch(self, P, threshold = None):
+
+        return self.engine.evaluate_batch(P, threshold)
 
     
     def update(self, x, x_value, pbest, pbest_value, dummy, dummy_value):
@@ -193,130 +347,44 @@ class chaos:
         # select the best generated particles
         elite_idxs = np.argsort(dummy_value)[:4 * self.n // 5]
 
-        print(elite_idxs)
+        logger.debug('chaos elite particles: %s', elite_idxs)
         
         # update 4N/5 particles using these elite generated ones
-        for j,idx in enumerate(elite_idxs):
+        k = len(elite_idxs)
 
-            for g in range(self.m_c):
-                x[j + 1, g] = dummy[idx, g]
-                
-                x_value[j + 1] = dummy_value[j]
+        x[1:k + 1] = dummy[elite_idxs]
+        x_value[1:k + 1] = dummy_value[elite_idxs]
 
-            if dummy_value[idx] < pbest_value[j]:
+        # the elite j becomes the pbest of particle j + 1 if it is better
+        better = np.flatnonzero(dummy_value[elite_idxs] < pbest_value[1:k + 1])
 
-                pbest_value[j + 1] = dummy_value[idx]
-                
-                for g in range(0, self.m_c):
-                    pbest[j + 1, g] = dummy[idx, g]
+        pbest_value[better + 1] = dummy_value[elite_idxs[better]]
+        pbest[better + 1] = dummy[elite_idxs[better]]
 
-               
-        
         return (x, x_value, pbest, pbest_value)
 
 
     def update2(self, x, pbest, pbest_value, dummy, dummy_value, fitness, tmp, achieved):   
         
-        idx = random.sample(range(1, self.n), 3 * self.n // 5)
+        idx = np.array(random.sample(range(1, self.n), 3 * self.n // 5))
         
         if not achieved:
 
             if pbest_value[idx[0]] > min(fitness):
-                
-                for g in range(0, self.m_c):
-                    
-                    x[idx[0], g] = tmp[g]                   
-                    
-                    pbest[idx[0], g] = tmp[g]
-                    
-                    pbest_value[idx[0]] = min(fitness)
-
-            for i in range(1, len(idx)):
-                
-                for g in range(0, self.m_c):
-
-                        x[idx[i], g] = dummy[idx[i], g]
-
-                        if pbest_value[idx[i]] > dummy_value[idx[i]]:
-
-                            pbest[idx[i], g] = dummy[idx[i], g]
-
-                            pbest_value[idx[i]] = dummy_value[idx[i]]
-
-        else:
-            
-            for i in range(0, len(idx)):
-                
-                for g in range(0, self.m_c):
-
-                    x[idx[i], g] = dummy[idx[i], g]
-
-                    if pbest_value[idx[i]] > dummy_value[idx[i]]:
-
-                        pbest[idx[i], g] = dummy[idx[i], g]
-
-                        pbest_value[idx[i]] = dummy_value[idx[i]]
-       
 
-    def __getTransferFunctionOutput(self, tf, U, T, X0, atol=1e-12):
-        """
-        This method sends a drive signal to a transfer function model and gets 
-        the output
-        Args:
-        - tf = transfer function
-        - U = signal to drive transfer function with
-        - T = array of time values
-        - X0 = initial value
-        - atol = scipy ode func parameter
-        Returns:
-        - PV = resultant output signal of transfer function
-        """
-
-        
-        T = np.linspace(T[0], T[-1], 240)
+                x[idx[0]] = pbest[idx[0]] = tmp
 
-        U = np.array(U)
-        sample = 240
-        p = upsampling.ups(sample)
-        input_init = np.copy(U)
-        
-        PV = np.zeros((self.q, sample))
-        for j in range(self.q):
-            if j > 0:
-                X0 =  self.__find_x_init(tf[j-1])
+                pbest_value[idx[0]] = min(fitness)
 
-            input = input_init[:self.m]
-            input = p.create(input)
+            idx = idx[1:]
 
-            
-            (_, PV[j], _) = signal.lsim2(tf[j], input, T, X0=X0, atol=atol) 
-            input_init = input_init[self.m:]
-        
-            min_PV = np.copy(min(PV[j]))
-            if min_PV < 0:
-                for i in range(0, len(PV[j])):
-                    PV[j][i] = PV[j][i] + abs(min_PV)
+        x[idx] = dummy[idx]
 
-        return PV
-    
-    def __find_x_init(self, tf):
+        better = idx[pbest_value[idx] > dummy_value[idx]]
 
-    
-        """
-        This method calculates the state-vector from a long -1 drive signal. 
-        Must call before sending / receiving signals to / from transfer function 
-        model
-        Args:
-        - tf = transfer function
-        Returns:
-        - X0 = system's state-vector result for steady state
-        """
-        U = np.array([-1.0] * 480)
-        T = np.linspace(0, 40e-9, 480)
-        (_, _, xout) = signal.lsim2(tf, U=U, T=T, X0=None, atol=1e-13)
-        X0 = xout[-1]
+        pbest[better] = dummy[better]
+        pbest_value[better] = dummy_value[better]
 
-        return X0
 
 
 class ol:
@@ -329,7 +397,11 @@ class ol:
                 X0,
                 cost_f,
                 st_importance_factor,
-                SP):
+                SP,
+                backend = 'foh',
+                executor = 'serial',
+                workers = None,
+                engine = None):
         '''
         Orthogonal Learning PSO
         
@@ -343,6 +415,10 @@ class ol:
         - X0: initial steady state value
         - cost_f: cost function selected
         - min/max_val: position boundaries
+        - backend: simulation backend, see soa_engine.BACKENDS
+        - executor/workers: parallel evaluation of batches, see soa_engine
+        - engine: soa_engine shared with other optimisers, built from the
+          parameters above if not given
         '''
         
         self.m = m
@@ -368,9 +444,16 @@ class ol:
         self.st_importance_factor = st_importance_factor
         
         self.SP = SP
+
+        if engine is None:
+            engine = soa_engine.soa_engine(sim_model, t2, X0, m, q, cost_f, st_importance_factor, SP, backend=backend,
+                                           executor=executor, workers=workers)
+
+        self.engine = engine
        
         
     
+    @profiling.timed('ol.evaluate')
     def evaluate(self, pbest, gbest):
         '''
         Performs OL
@@ -383,27 +466,14 @@ class ol:
         
         # Generate OA
         L = self.OA()
-        
-        # Array that holds fitness values
-        f = np.ones(len(L))
 
-        for i in range(len(L)):
-            
-            # Stores values for signal to evaluate
-            signal_b = np.zeros(self.m_c)
-
-            for j in range(len(L[0])):
+        # Level combinations to evaluate, one row per OA row: SOA j takes
+        # its slice from pbest at level 1 and from gbest otherwise
+        levels = np.repeat(L[:, :self.D] == 1, self.m, axis=1)
+        signals = np.where(levels, pbest[:self.m_c], gbest[:self.m_c])
 
-                if L[i, j] == 1:
-                    
-                    for g in range(j * self.m, (j + 1) * self.m):
-                        signal_b[g] = pbest[g]
-                
-                else:
-                    for g in range(j * self.m, (j + 1) * self.m):
-                        signal_b[g] = gbest[g]
-            # evaluate each generated combinatino   
-            f[i] = self.get_cost(signal_b)
+        # evaluate every generated combination at once
+        f = self.evaluate_batch(signals)
         
         # select level combination with lowest cost
         idx = np.argsort(f)[0]
@@ -412,24 +482,12 @@ class ol:
         signal_b_fit = f[idx]
            
         # store best OA combination
-        for j in range(self.D):
-            
-            if L[idx, j] == 1:
-
-                for g in range(j * self.m, (j + 1) * self.m):
-                
-                    signal_b[g] = pbest[g]
-
-            else:
-
-                for g in range(j * self.m, (j + 1) * self.m):
-                
-                    signal_b[j] = gbest[j]
+        signal_b = np.copy(signals[idx])
         
         # Store information about signal from factor analysis
         signal_p, signal_p_fit = self.factor_analysis(L, f, pbest, gbest)
 
-        print(signal_b_fit, signal_p_fit)
+        logger.debug('OL best combination cost %s, factor analysis cost %s', signal_b_fit, signal_p_fit)
         
         # return signal with smaller cost
         if signal_b_fit < signal_p_fit:
@@ -438,6 +496,7 @@ class ol:
         else:
             return signal_b        
 
+    @profiling.timed('ol.OA')
     def OA(self):
         '''
         Generates OA using Zhan's methodology
@@ -467,11 +526,12 @@ class ol:
         
         L = L[1:, 1:]
 
-        print(L)
+        logger.debug('OA:\n%s', L)
 
         return L
     
     
+    @profiling.timed('ol.factor_analysis')
     def factor_analysis(self, L, f, pbest, gbest):
         
         '''
@@ -526,85 +586,22 @@ class ol:
         return signal_p, signal_p_fit
         
     
-    def __getTransferFunctionOutput(self, tf, U, T, X0, atol=1e-12):
-        """
-        This method sends a drive signal to a transfer function model and gets 
-        the output
-        Args:
-        - tf = transfer function
-        - U = signal to drive transfer function with
-        - T = array of time values
-        - X0 = initial value
-        - atol = scipy ode func parameter
-        Returns:
-        - PV = resultant output signal of transfer function
-        """
-
-        
-        T = np.linspace(T[0], T[-1], 240)
-
-        U = np.array(U)
-        sample = 240
-        p = upsampling.ups(sample)
-        input_init = np.copy(U)
-        
-        PV = np.zeros((self.q, sample))
-        for j in range(self.q):
-            if j > 0:
-                X0 =  self.__find_x_init(tf[j-1])
-
-            input = input_init[:self.m]
-            input = p.create(input)
-
-            
-            (_, PV[j], _) = signal.lsim2(tf[j], input, T, X0=X0, atol=atol) 
-            input_init = input_init[self.m:]
-        
-            min_PV = np.copy(min(PV[j]))
-            if min_PV < 0:
-                for i in range(0, len(PV[j])):
-                    PV[j][i] = PV[j][i] + abs(min_PV)
+    def get_cost(self, p):
 
-        return PV
-    
-    
-    def __find_x_init(self, tf):
+        return self.engine.get_cost(p)
 
-    
-        """
-        This method calculates the state-vector from a long -1 drive signal. 
-        Must call before sending / receiving signals to / from transfer function 
-        model
-        Args:
-        - tf = transfer function
-        Returns:
-        - X0 = system's state-vector result for steady state
-        """
-        U = np.array([-1.0] * 480)
-        T = np.linspace(0, 40e-9, 480)
-        (_, _, xout) = signal.lsim2(tf, U=U, T=T, X0=None, atol=1e-13)
-        X0 = xout[-1]
 
-        return X0
+    def evaluate_batch(self, P, threshold = None):
 
-    
-    def get_cost(self, p):
-    
-        fitness = np.zeros(self.q)
-        
-        PV_OL = self.__getTransferFunctionOutput(self.sim_model, p, self.t2, self.X0)
-        for i in range(self.q):
-            fitness[i] = signalprocessing.cost(self.t2, 
-                                            PV_OL[i], 
-                                            cost_function_label=self.cost_f, 
-                                            st_importance_factor=self.st_importance_factor, 
-                                            SP=self.SP[i]).costEval
+        return self.engine.evaluate_batch(P, threshold)
 
-        return np.sum(fitness)
 
 
+class cpso_sk(checkpoint.stateful):
 
-class cpso_sk:
+    # attributes saved by checkpoints
+    STATE = ('x', 'v', 'x_value', 'pbest', 'pbest_value', 'context', 'context_cost', 'w', 'c1', 'c2',
+             'rel_improv', 'LB', 'UB', 'v_LB', 'v_UB')
 
     def __init__(self,
                 n, 
@@ -628,8 +625,13 @@ class cpso_sk:
                 c2_max,
                 w_init,
                 w_final,
-                step = 'soa'):
-        ''''
+                step = 'soa',
+                backend = 'foh',
+                executor = 'serial',
+                workers = None,
+                engine = None,
+                lookahead = None):
+        '''
         Cooperative PSO
          Parameters:
         - n: number of particles
@@ -645,7 +647,17 @@ class cpso_sk:
         - min/max_val: position boundaries
         - x/pbest/gbest: current/ personal best/global best positions
         - x_value/pbest_value/gbest_cost: current/personal best/global best cost
-        ''''
+        - backend: simulation backend, see soa_engine.BACKENDS
+        - executor/workers: parallel evaluation of batches, see soa_engine
+        - engine: soa_engine shared with other optimisers, built from the
+          parameters above if not given
+        - lookahead: most particles whose moves are simulated in one batch.
+          Moves of the particles after the first assume the context vector
+          does not change and are simulated again if it does. Batches start
+          at one particle, double while the context holds and halve when it
+          changes. Every particle if None and the engine batches cheaply (see
+          soa_engine.batched), one at a time otherwise
+        '''
         
         self.n = n
 
@@ -669,6 +681,14 @@ class cpso_sk:
 
         self.step = step
 
+        self.lookahead = lookahead
+
+        if engine is None:
+            engine = soa_engine.soa_engine(sim_model, t2, X0, m, q, cost_f, st_importance_factor, SP, backend=backend,
+                                           executor=executor, workers=workers)
+
+        self.engine = engine
+
         self.w_init = w_init
 
         self.w_final = w_final
@@ -720,8 +740,10 @@ class cpso_sk:
         self.context = np.copy(gbest)
 
         self.context_cost = self.get_cost(self.context)
+
+
     
-    
+    @profiling.timed('cpso.partition')
     def partition(self):
         '''
         Partitions and optimizes the solution
@@ -730,76 +752,75 @@ class cpso_sk:
 
         if self.step == 'soa':
 
-            for j in range(self.n):
+            # previous positions and random coefficients for the whole sweep
+            tmp = np.copy(self.x)
 
-                tmp = np.copy(self.x[j])
-                
-                self.x[j] = np.copy(self.context)
+            r1 = np.random.uniform(0, 1, (self.n, self.m_c))
+            r2 = np.random.uniform(0, 1, (self.n, self.m_c))
 
-                for q in range(self.q):
-                    
-                    # adjust range so only one soa is optimized at a time
+            steps = [(j, q) for j in range(self.n) for q in range(self.q)]
 
-                    for g in range(q * (self.m), (q + 1) * self.m):
+            # particles per batch, doubled up to the lookahead while the
+            # context holds and halved when it changes under a batch
+            lookahead = self.lookahead or (self.n if self.engine.batched() else 1)
+            width, dropped = 1, None
 
-                        self.x[j, g] = tmp[g]
+            # moves of steps[first:stop], evaluated ahead of their turn
+            s = first = stop = 0
 
+            while s < len(steps) and self.engine.exhausted() is None:
 
-                    self.rel_improv[q, j] = (self.pbest_value[q, j] - self.x_value[q, j]) \
-                        / (self.pbest_value[q, j] + self.x_value[q, j]) 
-                    
-                    self.w[q, j] = self.w_init + ( (self.w_final - self.w_init) * \
-                        ((math.exp(self.rel_improv[q, j]) - 1) / (math.exp(self.rel_improv[q, j]) + 1)) ) 
-                    
-                    self.c1[q, j] = ((self.c1_min + self.c1_max)/2) + ((self.c1_max - self.c1_min)/2) + \
-                        (math.exp(- self.rel_improv[q, j]) - 1) / (math.exp(-self.rel_improv[q, j]) + 1) 
-                    
-                    self.c2[q, j] = ((self.c2_min + self.c2_max)/2) + ((self.c2_max - self.c2_min)/2) + \
-                        (math.exp(- self.rel_improv[q, j]) - 1) / (math.exp( - self.rel_improv[q, j]) + 1)
-                    
-                    
-                    for g in range(q * (self.m), (q + 1) * self.m):
-                            self.v[j, g] = ((self.w[q, j] * self.v[j, g]) + (self.c1[q, j] * random.uniform(0, 1) \
-                                * (self.pbest[j, g] - self.x[j, g]) + (self.c2[q, j] * \
-                                    random.uniform(0, 1) * (self.context[g] - self.x[j,g]))))
+                if s == stop:
+                    if dropped is not None:
+                        width = max(width // 2, 1) if dropped else min(2 * width, lookahead)
 
-                    
-                    for g in range(0, self.m_c):
-                        if self.v[j, g] > self.v_UB[g]:
-                            self.v[j, g] = self.v_UB[g]
-                        if self.v[j, g] < self.v_LB[g]:
-                            self.v[j, g] = self.v_LB[g]
-                
-                    for g in range(q * (self.m), (q + 1) * self.m):
-                        self.x[j, g] = self.x[j, g] + self.v[j, g]
-                
+                    # Move the next particles, every SOA of each, against
+                    # the current context vector
+                    J = np.arange(steps[s][0], min(steps[s][0] + width, self.n))
 
-                    for g in range(0, self.m_c):
-                        if self.x[j, g] < self.LB[g]:
-                            self.x[j, g] = self.LB[g]
-                        elif self.x[j, g] > self.UB[g]:
-                            self.x[j, g] = self.UB[g]
+                    (x, v, rel_improv, w, c1, c2) = self.__move(J, tmp, r1, r2)
 
-                    
-                    self.x_value[q, j] = self.get_cost(self.x[j])
+                    first, stop, dropped = s, s + len(J) * self.q, False
 
-                    
-                    if self.x_value[q, j] < self.pbest_value[q, j]:
+                    # a move only matters if it beats its pbest or the context,
+                    # neither of which rises before the move is processed
+                    threshold = np.maximum(self.pbest_value[:, J].T.ravel(), self.context_cost)
 
-                        self.pbest_value[q, j] = self.x_value[q, j]
+                    costs = self.evaluate_batch(x, threshold)
 
-                        for g in range(q * (self.m),  (q + 1) * self.m):
-                                self.pbest[j, g] = self.x[j, g]
-                    
-                    # if new solution has lower cost, update the context vector
+                (j, q), k = steps[s], s - first
+
+                self.x[j], self.v[j] = x[k], v[k]
+
+                (self.rel_improv[q, j], self.w[q, j], self.c1[q, j], self.c2[q, j]) = \
+                    (rel_improv[k], w[k], c1[k], c2[k])
+                
+                self.x_value[q, j] = costs[k]
+
+                s = s + 1
+
+                g = slice(q * self.m, (q + 1) * self.m)
+                
+                if self.x_value[q, j] < self.pbest_value[q, j]:
 
-                    if self.x_value[q, j] < self.context_cost:
+                    self.pbest_value[q, j] = self.x_value[q, j]
 
-                        self.context_cost = self.x_value[q, j]
+                    self.pbest[j, g] = self.x[j, g]
+                
+                # if new solution has lower cost, update the context vector
+
+                if self.x_value[q, j] < self.context_cost:
 
-                        for g in range(q * (self.m),  (q + 1) * self.m):
+                    self.context_cost = self.x_value[q, j]
 
-                            self.context[g] = self.x[j, g]
+                    self.context[g] = self.x[j, g]
+
+                    # the moves of the next particles used the old context.
+                    # Those left of particle j go on from its own position
+                    # and read the context only on SOAs it has not moved, so
+                    # they stay valid
+                    dropped = dropped or stop > (j + 1) * self.q
+                    stop = min(stop, (j + 1) * self.q)
                 
             return self.context, self.context_cost
 
@@ -807,82 +828,84 @@ class cpso_sk:
 
             pass
 
-    
-    def __getTransferFunctionOutput(self, tf, U, T, X0, atol=1e-12):
-        """
-        This method sends a drive signal to a transfer function model and gets 
-        the output
-        Args:
-        - tf = transfer function
-        - U = signal to drive transfer function with
-        - T = array of time values
-        - X0 = initial value
-        - atol = scipy ode func parameter
+
+    def __move(self, J, tmp, r1, r2):
+        '''
+        Moves particles J one SOA slice at a time, starting from the context
+        vector, towards their personal best and the context vector. Works on
+        copies of the positions and velocities so moves can be generated
+        ahead of their evaluation
+        Parameters:
+        - J: particle indices
+        - tmp: positions of the particles before the sweep
+        - r1/r2: random coefficients of the sweep
         Returns:
-        - PV = resultant output signal of transfer function
-        """
+        - positions, velocities, rel_improv, w, c1 and c2 after each move, 
+          ordered by particle then SOA
+        '''
 
-        
-        T = np.linspace(T[0], T[-1], 240)
+        n = len(J)
 
-        U = np.array(U)
-        sample = 240
-        p = upsampling.ups(sample)
-        input_init = np.copy(U)
-        
-        PV = np.zeros((self.q, sample))
-        for j in range(self.q):
-            if j > 0:
-                X0 =  self.__find_x_init(tf[j-1])
+        x = np.zeros((n, self.q, self.m_c))
+        v = np.zeros((n, self.q, self.m_c))
 
-            input = input_init[:self.m]
-            input = p.create(input)
+        x_J = np.tile(self.context, (n, 1))
+        v_J = np.copy(self.v[J])
 
-            
-            (_, PV[j], _) = signal.lsim2(tf[j], input, T, X0=X0, atol=atol) 
-            input_init = input_init[self.m:]
-        
-            min_PV = np.copy(min(PV[j]))
-            if min_PV < 0:
-                for i in range(0, len(PV[j])):
-                    PV[j][i] = PV[j][i] + abs(min_PV)
+        pbest_value = self.pbest_value[:, J].T
+        x_value = self.x_value[:, J].T
 
-        return PV
-    
-    
-    def __find_x_init(self, tf):
+        with np.errstate(invalid='ignore'):
+            rel_improv = (pbest_value - x_value) / (pbest_value + x_value)
 
-    
-        """
-        This method calculates the state-vector from a long -1 drive signal. 
-        Must call before sending / receiving signals to / from transfer function 
-        model
-        Args:
-        - tf = transfer function
-        Returns:
-        - X0 = system's state-vector result for steady state
-        """
-        U = np.array([-1.0] * 480)
-        T = np.linspace(0, 40e-9, 480)
-        (_, _, xout) = signal.lsim2(tf, U=U, T=T, X0=None, atol=1e-13)
-        X0 = xout[-1]
+        w = self.w_init + ( (self.w_final - self.w_init) * \
+            ((np.exp(rel_improv) - 1) / (np.exp(rel_improv) + 1)) )
+
+        c1 = ((self.c1_min + self.c1_max)/2) + ((self.c1_max - self.c1_min)/2) + \
+            (np.exp(- rel_improv) - 1) / (np.exp(- rel_improv) + 1)
+
+        c2 = ((self.c2_min + self.c2_max)/2) + ((self.c2_max - self.c2_min)/2) + \
+            (np.exp(- rel_improv) - 1) / (np.exp(- rel_improv) + 1)
+
+        # a rejected move (infinite cost) has no exact cost to adapt to, its
+        # particle keeps the coefficients of that SOA
+        rejected = np.isinf(x_value)
+
+        rel_improv = np.where(rejected, self.rel_improv[:, J].T, rel_improv)
+        w = np.where(rejected, self.w[:, J].T, w)
+        c1 = np.where(rejected, self.c1[:, J].T, c1)
+        c2 = np.where(rejected, self.c2[:, J].T, c2)
 
-        return X0
+        for k in range(self.q):
+
+            g = slice(k * self.m, (k + 1) * self.m)
+
+            # adjust range so only one soa is optimized at a time
+            x_J[:, g] = tmp[J, g]
+
+            v_J[:, g] = (w[:, k, None] * v_J[:, g]) + ((c1[:, k, None] * r1[J, g]) * (self.pbest[J, g] - x_J[:, g]) \
+                + ((c2[:, k, None] * r2[J, g]) * (self.context[g] - x_J[:, g])))
+
+            np.clip(v_J, self.v_LB, self.v_UB, out=v_J)
+
+            x_J[:, g] += v_J[:, g]
+
+            np.clip(x_J, self.LB, self.UB, out=x_J)
+
+            x[:, k], v[:, k] = x_J, v_J
+
+        return (x.reshape(-1, self.m_c), v.reshape(-1, self.m_c), rel_improv.ravel(), 
+                w.ravel(), c1.ravel(), c2.ravel())
 
     
     def get_cost(self, p):
-    
-        fitness = np.zeros(self.q)
-        
-        PV_OL = self.__getTransferFunctionOutput(self.sim_model, p, self.t2, self.X0)
-        for i in range(self.q):
-            fitness[i] = signalprocessing.cost(self.t2, 
-                                            PV_OL[i], 
-                                            cost_function_label=self.cost_f, 
-                                            st_importance_factor=self.st_importance_factor, 
-                                            SP=self.SP[i]).costEval
 
-        return np.sum(fitness)
+        return self.engine.get_cost(p)
+
+
+    def evaluate_batch(self, P, threshold = None):
+
+        return self.engine.evaluate_batch(P, threshold)
 
 
     def cascade(self, x):
@@ -0,0 +1,139 @@
+import logging
+import math
+import time
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+
+# events of an iteration, combined as bit flags
+CHAOS = 1
+REGROUP = 2
+OL = 4
+
+# one record per iteration
+DTYPE = np.dtype([
+    ('iteration', np.int64),
+    ('gbest_cost', np.float64),
+    ('swarm_radius', np.float64),
+    ('evaluations', np.int64),
+    ('elapsed', np.float64),
+    ('duration', np.float64),
+    ('events', np.int64),
+])
+
+
+class history:
+
+    def __init__(self, iter_max, path = None, log_interval = 1.0):
+        '''
+        Per-iteration record of a run in a preallocated structured array
+
+        Parameters:
+        - iter_max: number of iterations to preallocate
+        - path: if given, records go to a memory-mapped .npy file, so a
+          crashed run keeps them. Otherwise kept in memory and grown as needed
+        - log_interval: seconds between two progress messages (INFO level
+          of the history logger)
+        '''
+
+        self.path = path
+
+        if path is None:
+            self.records = np.zeros(iter_max, dtype=DTYPE)
+        else:
+            self.records = np.lib.format.open_memmap(path, mode='w+', dtype=DTYPE, shape=(iter_max,))
+
+        self.count = 0
+
+        # run time before the current process, for resumed runs
+        self.elapsed = 0.0
+
+        self.log_interval = log_interval
+
+        self.__start = time.perf_counter()
+        self.__last = self.__start
+        self.__logged = - math.inf
+
+
+    def record(self, iteration, gbest_cost, swarm_radius, evaluations, events = 0):
+        """
+        This method appends the record of an iteration
+        Args:
+        - iteration = iteration number
+        - gbest_cost = best cost found so far
+        - swarm_radius = swarm radius after the iteration
+        - evaluations = signals simulated so far
+        - events = CHAOS, REGROUP and OL flags of the iteration
+        """
+
+        if self.count == len(self.records):
+            if self.path is not None:
+                raise IndexError(f'history of {self.path} is full ({self.count} iterations)')
+
+            self.records = np.resize(self.records, 2 * max(self.count, 1))
+
+        now = time.perf_counter()
+
+        self.records[self.count] = (iteration, gbest_cost, swarm_radius, evaluations,
+                                    self.elapsed + now - self.__start, now - self.__last, events)
+        self.count += 1
+
+        self.__last = now
+
+        if now - self.__logged >= self.log_interval and logger.isEnabledFor(logging.INFO):
+            self.__logged = now
+            logger.info('iteration %d: gbest cost %.6g, swarm radius %.3g, %d evaluations',
+                        iteration, gbest_cost, swarm_radius, evaluations)
+
+
+    def columns(self):
+        """
+        Returns the recorded iterations as a dict of arrays, one per field
+        """
+
+        return {name: np.copy(self.records[name][:self.count]) for name in DTYPE.names}
+
+
+    def export(self, path):
+        """
+        Writes the recorded iterations to an .npz file, one array per field
+        """
+
+        np.savez(path, **self.columns())
+
+
+    def flush(self):
+        """
+        Writes a memory-mapped history to disk
+        """
+
+        if self.path is not None:
+            self.records.flush()
+
+
+    def state_dict(self):
+        """
+        Returns the recorded iterations and the run time so far
+        """
+
+        return {'records': self.records[:self.count].copy(), 'count': self.count,
+                'elapsed': self.elapsed + time.perf_counter() - self.__start}
+
+
+    def load_state_dict(self, state):
+        """
+        Restores the state returned by state_dict
+        """
+        count = int(state['count'])
+
+        if count > len(self.records):
+            self.records = np.resize(self.records, count)
+
+        self.records[:count] = state['records']
+        self.count = count
+        self.elapsed = float(state['elapsed'])
+
+        self.__start = self.__last = time.perf_counter()
@@ -0,0 +1,148 @@
+import functools
+import json
+import time
+
+
+# per section statistics: calls, seconds, evaluations, improvement
+FIELDS = ('calls', 'seconds', 'evaluations', 'improvement')
+
+
+class profiler:
+
+    def __init__(self):
+        '''
+        Call counts, wall time and evaluations of the sections of a run,
+        and the cost improvement credited to each. Sections are functions
+        wrapped with timed(), so a disabled profiler costs one attribute test
+        per call. Times and evaluations of a section include the sections
+        it calls, e.g. chaos.cls includes the engine.evaluate_batch it makes
+        '''
+
+        self.enabled = False
+        self.counter = None
+
+        self.reset()
+
+
+    def enable(self, counter = None):
+        """
+        This method starts collecting
+        Args:
+        - counter = callable returning the number of evaluations so far,
+        e.g. lambda: engine.evaluations. Evaluations are not counted if None
+        """
+
+        self.counter = counter
+        self.enabled = True
+
+
+    def disable(self):
+
+        self.enabled = False
+        self.counter = None
+
+
+    def reset(self):
+        """
+        This method forgets every statistic collected so far
+        """
+
+        self.stats = {}
+
+
+    def timed(self, name):
+        """
+        This method returns a decorator recording the calls of a function
+        under name
+        """
+
+        def decorate(function):
+
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+
+                if not self.enabled:
+                    return function(*args, **kwargs)
+
+                counter = self.counter
+                evaluations = counter() if counter is not None else 0
+                start = time.perf_counter()
+
+                try:
+                    return function(*args, **kwargs)
+
+                finally:
+                    stats = self.__section(name)
+                    stats[0] += 1
+                    stats[1] += time.perf_counter() - start
+
+                    if counter is not None:
+                        stats[2] += counter() - evaluations
+
+            return wrapper
+
+        return decorate
+
+
+    def improved(self, name, amount):
+        """
+        This method credits a cost reduction to the section name
+        """
+
+        if self.enabled:
+            self.__section(name)[3] += float(amount)
+
+
+    def summary(self):
+        """
+        Returns {section: {calls, seconds, evaluations, improvement,
+        improvement_per_evaluation}}, sections by decreasing time
+        """
+        summary = {}
+
+        for name, stats in sorted(self.stats.items(), key=lambda item: - item[1][1]):
+            summary[name] = dict(zip(FIELDS, stats))
+            summary[name]['improvement_per_evaluation'] = stats[3] / stats[2] if stats[2] else 0.0
+
+        return summary
+
+
+    def report(self):
+        """
+        Returns the summary as a text table
+        """
+        lines = [f"{'section':<28}{'calls':>9}{'seconds':>11}{'ms/call':>10}{'evals':>10}{'improvement':>14}"
+                 f"{'impr/eval':>12}"]
+
+        for name, s in self.summary().items():
+            per_call = 1e3 * s['seconds'] / max(s['calls'], 1)
+
+            lines.append(f"{name:<28}{s['calls']:>9d}{s['seconds']:>11.3f}{per_call:>10.3f}"
+                         f"{s['evaluations']:>10d}{s['improvement']:>14.4g}{s['improvement_per_evaluation']:>12.4g}")
+
+        return '\n'.join(lines)
+
+
+    def export(self, path):
+        """
+        Writes the summary to a JSON file
+        """
+
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent = 1)
+
+
+    def __section(self, name):
+
+        stats = self.stats.get(name)
+
+        if stats is None:
+            stats = self.stats[name] = [0, 0.0, 0, 0.0]
+
+        return stats
+
+
+# profiler of the process, shared by every optimiser and engine
+PROFILER = profiler()
+
+timed = PROFILER.timed
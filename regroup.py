@@ -1,33 +1,94 @@
-  def regroup(self, x, gbest, v):
-      """
-      This method regroups the data if premature convergence is found and updates boundaries
+import json
 
-      Args:
-      - Particle Positions
-      - Global Best Positions
+import numpy as np
 
-      Returns:
-      -
-      """
+import checkpoint
+import profiling
 
-      for g in range(0, self.m_c):
 
-          dist = 0
+class regroup(checkpoint.stateful):
 
-          for j in range(0, self.n):
+    # attributes saved by checkpoints
+    STATE = ('range_regroup', 'LB', 'UB', 'v_LB', 'v_UB')
 
-              dist = max(dist, abs(x[j, g] - gbest[g]))
+    def __init__(self, n, m_c, rho, lmd, min_val = -1.0, max_val = 1.0, rng = None):
+        '''
+        Regrouping of a prematurely converged swarm around gbest
 
-          self.range_regroup[g] = self.rho * dist
+        Parameters:
+        - n: number of particles
+        - m_c: dimensions of the (cascaded) control signal
+        - rho: regrouping factor, scales the swarm extent into the new range
+        - lmd: velocity clamping factor of the new range
+        - min/max_val: initial position boundaries
+        - rng: numpy Generator (or seed) for the random resets
+        '''
 
-          self.LB[g] = gbest[g] - 0.5 * self.range_regroup[g]
-          self.UB[g] = gbest[g] + 0.5 * self.range_regroup[g]
+        self.n = n
+        self.m_c = m_c
+        self.rho = rho
+        self.lmd = lmd
 
-          self.v_LB[g] = - self.lmd * self.range_regroup[g]
-          self.v_UB[g] = self.lmd * self.range_regroup[g]
+        self.rng = np.random.default_rng(rng)
 
-      for j in range(0, self.n):
+        self.range_regroup = np.full(self.m_c, max_val - min_val)
 
-          for g in range(0, self.m_c):
+        self.LB = np.full(self.m_c, min_val)
+        self.UB = np.full(self.m_c, max_val)
 
-              x[j, g] = 0.7 * gbest[g] +  0.3 * x[j,g] * v[j,g] + random.uniform(0,1) * self.range_regroup[g] - 0.5 * self.range_regroup[g]
+        self.v_LB = - self.lmd * self.range_regroup
+        self.v_UB = self.lmd * self.range_regroup
+
+
+    def state_dict(self):
+        """
+        Returns the state that changes during a run, as arrays. The random
+        generator state is stored as JSON, its integers exceed 64 bits
+        """
+
+        state = super().state_dict()
+        state['rng'] = np.array(json.dumps(self.rng.bit_generator.state))
+
+        return state
+
+
+    def load_state_dict(self, state):
+        """
+        Restores the state returned by state_dict
+        """
+
+        super().load_state_dict(state)
+
+        self.rng.bit_generator.state = json.loads(str(state['rng']))
+
+
+    @profiling.timed('regroup.regroup')
+    def regroup(self, x, gbest, v):
+        """
+        This method regroups the data if premature convergence is found and updates boundaries
+
+        Args:
+        - x = (n x m_c) particle positions, reset in place
+        - gbest = global best position
+        - v = (n x m_c) particle velocities
+
+        Returns:
+        - x = regrouped particle positions
+        """
+
+        # extent of the swarm around gbest in every dimension
+        dist = np.max(np.abs(x - gbest), axis=0)
+
+        self.range_regroup = self.rho * dist
+
+        self.LB = gbest - 0.5 * self.range_regroup
+        self.UB = gbest + 0.5 * self.range_regroup
+
+        self.v_LB = - self.lmd * self.range_regroup
+        self.v_UB = self.lmd * self.range_regroup
+
+        r = self.rng.uniform(0, 1, x.shape)
+
+        x[:] = 0.7 * gbest + 0.3 * x * v + r * self.range_regroup - 0.5 * self.range_regroup
+
+        return x
@@ -0,0 +1,95 @@
+import sys
+
+import numpy as np
+
+
+# soa package of the author's checkout, where analyse lives. It used to be
+# appended by timing_analysis, which now measures through this module
+sys.path.append('C:\\Users\\billv\\3project\\soa_driving\\pso\\soa')
+
+try:
+    from soa import analyse
+except ImportError:
+    # only needed for reference(), the definition measure() is checked
+    # against in tests/test_response.py
+    analyse = None
+
+
+def measure(PV, t, rise = (0.1, 0.9), band = 0.05, tail = 0.1, t_step = None):
+    """
+    This method measures the step response of every signal of a batch at
+    once, from threshold crossings and a settling envelope
+    Args:
+    - PV = (..., samples) output signals, e.g. (signals x samples) or the
+    (particles x q x samples) outputs of soa_engine
+    - t = (samples,) time grid
+    - rise = fractions of the step the rise time is measured between
+    - band = half width of the settling envelope, as a fraction of the step
+    - tail = fraction of the samples at the end averaged for the final value
+    - t_step = time of the input step, settling time is measured from it
+    (t[0] if None)
+    Returns:
+    - (rt, st, os, st_index) arrays of shape PV.shape[:-1]: rise time,
+    settling time, overshoot in % of the step and index of the first
+    sample from which the signal stays in the envelope. Signals that never
+    cross a rise threshold get a nan rise time
+
+    These are the reported metrics. tests/test_response.py checks them
+    against soa.analyse.ResponseMeasurements (reference()) wherever the
+    soa package is installed
+    """
+    PV = np.asarray(PV, dtype=float)
+    t = np.asarray(t, dtype=float)
+    points = PV.shape[-1]
+
+    initial = PV[..., 0]
+    final = PV[..., -max(1, int(round(tail * points))):].mean(axis=-1)
+    step = final - initial
+
+    # signal as a fraction of the step, so falling steps rise too
+    with np.errstate(divide='ignore', invalid='ignore'):
+        y = (PV - initial[..., None]) / step[..., None]
+
+    # first crossing of each rise threshold
+    low, high = y >= rise[0], y >= rise[1]
+    i_low, i_high = low.argmax(axis=-1), high.argmax(axis=-1)
+
+    rt = t[i_high] - t[i_low]
+    rt = np.where(low.any(axis=-1) & high.any(axis=-1), rt, np.nan)
+
+    os = 100 * np.maximum(y.max(axis=-1) - 1, 0)
+
+    # last sample outside the envelope, the signal has settled after it
+    outside = np.abs(y - 1) > band
+    st_index = np.where(outside.any(axis=-1), points - outside[..., ::-1].argmax(axis=-1), 0)
+
+    st = t[np.minimum(st_index, points - 1)] - (t[0] if t_step is None else t_step)
+
+    return rt, st, os, st_index
+
+
+def reference(PV, t, t_step = None):
+    """
+    This method measures every signal of a batch with one
+    soa.analyse.ResponseMeasurements each
+    Args:
+    - PV, t, t_step = as measure(). ResponseMeasurements measures settling
+    from t[0], its settling times are shifted to count from t_step
+    Returns:
+    - (rt, st, os, st_index) as measure()
+    """
+
+    if analyse is None:
+        raise ImportError('soa.analyse is needed for the reference step response measurements')
+
+    PV = np.asarray(PV, dtype=float)
+    values = np.zeros((4,) + PV.shape[:-1])
+
+    for idx in np.ndindex(*PV.shape[:-1]):
+        r = analyse.ResponseMeasurements(PV[idx], t)
+        values[(slice(None),) + idx] = (r.riseTime, r.settlingTime, r.overshoot, r.settlingTimeIndex)
+
+    if t_step is not None:
+        values[1] -= t_step - t[0]
+
+    return values[0], values[1], values[2], values[3].astype(int)
@@ -0,0 +1,253 @@
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+
+# bumped whenever the layout of a store changes
+VERSION = 1
+
+SCHEMA = 'schema.json'
+
+
+class result_store:
+
+    def __init__(self, path, mode = 'r'):
+        '''
+        Columnar store of sweep results in one directory. Every append()
+        writes a chunk holding one .npy file per column, so a column of a
+        chunk is memory-mapped on first access and never parsed
+
+        - scalar and string columns hold one value per row
+        - signal columns (drive signals, outputs, time grids) hold one 1-D
+          array per row, of any length, as flat values plus row offsets
+
+        Parameters:
+        - path: store directory
+        - mode: 'r' to read, 'a' to read and append (created if missing)
+        '''
+
+        if mode not in ('r', 'a'):
+            raise ValueError(f'Unknown mode {mode}')
+
+        self.path = path
+        self.mode = mode
+
+        if os.path.exists(os.path.join(path, SCHEMA)):
+            with open(os.path.join(path, SCHEMA)) as f:
+                self.schema = json.load(f)
+
+            if self.schema['version'] != VERSION:
+                raise ValueError(f"Store version {self.schema['version']} is not supported (expected {VERSION})")
+
+        elif mode == 'a':
+            os.makedirs(path, exist_ok = True)
+            self.schema = {'version': VERSION, 'chunks': [], 'columns': {}}
+            self.__write_schema()
+
+        else:
+            raise FileNotFoundError(f'No result store at {path}')
+
+        self.__arrays = {}
+
+
+    def __len__(self):
+
+        return sum(self.schema['chunks'])
+
+
+    @property
+    def columns(self):
+        """
+        Returns the {name: 'scalar', 'string' or 'signal'} kinds of the columns
+        """
+
+        return dict(self.schema['columns'])
+
+
+    def append(self, rows):
+        """
+        This method adds a chunk of rows
+        Args:
+        - rows = list of dicts of column values. Missing values are stored
+        as nan, '' or an empty signal
+        """
+
+        if self.mode != 'a':
+            raise ValueError('Store opened read-only')
+
+        if not rows:
+            return
+
+        kinds = self.schema['columns']
+        names = list(kinds) + [name for row in rows for name in row if name not in kinds]
+        names = list(dict.fromkeys(names))
+
+        chunk = len(self.schema['chunks'])
+        directory = tempfile.mkdtemp(dir = self.path, prefix = '.chunk')
+
+        try:
+            for name in names:
+                values = [row.get(name) for row in rows]
+                kind = kinds.get(name) or _kind(values)
+
+                if kind == 'signal':
+                    arrays = [np.ravel(np.asarray(v, dtype=float)) if v is not None else np.zeros(0)
+                              for v in values]
+                    np.save(os.path.join(directory, name + '.npy'), np.concatenate(arrays))
+                    np.save(os.path.join(directory, name + '.offsets.npy'),
+                            np.cumsum([0] + [a.size for a in arrays]))
+
+                elif kind == 'string':
+                    np.save(os.path.join(directory, name + '.npy'), np.array(['' if v is None else str(v)
+                                                                              for v in values]))
+
+                else:
+                    np.save(os.path.join(directory, name + '.npy'), _scalars(values))
+
+                kinds[name] = kind
+
+            # the schema lists the chunks, one left by a crash between the
+            # rename and the schema write is not part of the store
+            target = os.path.join(self.path, f'chunk_{chunk:05d}')
+            if os.path.exists(target):
+                shutil.rmtree(target)
+
+            os.replace(directory, target)
+
+        except BaseException:
+            shutil.rmtree(directory, ignore_errors = True)
+            raise
+
+        self.schema['chunks'].append(len(rows))
+        self.__write_schema()
+
+
+    def column(self, name):
+        """
+        Returns every value of a scalar or string column
+        """
+        kind = self.schema['columns'].get(name)
+
+        if kind not in ('scalar', 'string'):
+            raise KeyError(f'{name} is not a scalar or string column')
+
+        return np.concatenate([self.__chunk_column(chunk, name, rows, kind)
+                               for chunk, rows in enumerate(self.schema['chunks'])])
+
+
+    def signal(self, name, row):
+        """
+        Returns the signal of one row, memory-mapped
+        """
+
+        if self.schema['columns'].get(name) != 'signal':
+            raise KeyError(f'{name} is not a signal column')
+
+        chunk, i = self.__locate(row)
+
+        values = self.__load(chunk, name)
+        offsets = self.__load(chunk, name + '.offsets')
+
+        if values is None:
+            return np.zeros(0)
+
+        return values[offsets[i]:offsets[i + 1]]
+
+
+    def signals(self, name, rows = None):
+        """
+        Returns the signals of several rows (all if None) as a 2-D array,
+        they must share a length
+        """
+        rows = range(len(self)) if rows is None else rows
+
+        return np.array([self.signal(name, row) for row in rows])
+
+
+    def where(self, **criteria):
+        """
+        Returns the indices of the rows whose scalar columns equal the
+        given values, e.g. where(m = 24, algorithm = 'hybrid')
+        """
+        mask = np.ones(len(self), dtype=bool)
+
+        for name, value in criteria.items():
+            mask &= self.column(name) == value
+
+        return np.flatnonzero(mask)
+
+
+    def row(self, row):
+        """
+        Returns every column of one row as a dict
+        """
+
+        return {name: self.signal(name, row) if kind == 'signal' else self.column(name)[row]
+                for name, kind in self.schema['columns'].items()}
+
+
+    def __locate(self, row):
+
+        if not 0 <= row < len(self):
+            raise IndexError(f'Row {row} out of range ({len(self)} rows)')
+
+        for chunk, rows in enumerate(self.schema['chunks']):
+            if row < rows:
+                return chunk, row
+            row -= rows
+
+
+    def __load(self, chunk, name):
+        # memory-mapped column of a chunk, None for columns added after it
+
+        key = (chunk, name)
+
+        if key not in self.__arrays:
+            file = os.path.join(self.path, f'chunk_{chunk:05d}', name + '.npy')
+            self.__arrays[key] = np.load(file, mmap_mode = 'r') if os.path.exists(file) else None
+
+        return self.__arrays[key]
+
+
+    def __chunk_column(self, chunk, name, rows, kind):
+
+        values = self.__load(chunk, name)
+
+        if values is None:
+            return np.full(rows, '') if kind == 'string' else np.full(rows, np.nan)
+
+        return values
+
+
+    def __write_schema(self):
+
+        fd, tmp = tempfile.mkstemp(dir = self.path, suffix = '.tmp')
+
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self.schema, f)
+
+        os.replace(tmp, os.path.join(self.path, SCHEMA))
+
+
+def _kind(values):
+    # kind of a new column from its first values
+
+    if any(np.ndim(v) > 0 for v in values):
+        return 'signal'
+
+    if any(isinstance(v, str) for v in values):
+        return 'string'
+
+    return 'scalar'
+
+
+def _scalars(values):
+    # integers stay integers unless a value is missing, then nan fills in
+
+    if all(isinstance(v, (bool, int, np.integer)) for v in values):
+        return np.array(values, dtype=np.int64)
+
+    return np.array([np.nan if v is None else v for v in values], dtype=float)
@@ -0,0 +1,167 @@
+import logging
+import math
+
+import numpy as np
+
+import checkpoint
+
+
+logger = logging.getLogger(__name__)
+
+
+# operators of an iteration of driver.hybrid_pso, cpso runs every iteration
+# and is the reference the optional operators are measured against
+OPERATORS = ('cpso', 'chaos', 'ol')
+
+# one record per decision
+DTYPE = np.dtype([
+    ('iteration', np.int64),
+    ('operator', np.int64),
+    ('budget', np.int64),
+    ('score', np.float64),
+    ('reference', np.float64),
+])
+
+
+class bandit(checkpoint.stateful):
+
+    # attributes saved by checkpoints
+    STATE = ('improvement', 'evaluations', 'pulls', 'rounds')
+
+    def __init__(self, rep = 50, min_rep = 5, max_rep = None, exploration = 2.0, discount = 0.9):
+        '''
+        Evaluation budget scheduler of the optional operators of an
+        iteration. Each operator is an arm whose reward is the relative
+        gbest cost reduction per evaluation, kept as discounted sums so the
+        estimate follows the run. An operator runs while its upper
+        confidence bound (UCB1) is at least the rate of the CPSO sweep, and
+        the chaotic search gets repetitions in proportion to that ratio, so
+        operators that stop paying off are starved and retried later as
+        their confidence bonus grows
+
+        Parameters:
+        - rep: chaotic search repetitions when it pays off as well as CPSO
+        - min/max_rep: range of the chaotic search budget, 2 * rep at most
+          if None
+        - exploration: weight of the confidence bonus
+        - discount: factor the statistics of an operator decay by at each
+          of its observations
+        '''
+
+        self.rep = rep
+        self.min_rep = min_rep
+        self.max_rep = 2 * rep if max_rep is None else max_rep
+        self.exploration = exploration
+        self.discount = discount
+
+        self.improvement = np.zeros(len(OPERATORS))
+        self.evaluations = np.zeros(len(OPERATORS))
+        self.pulls = np.zeros(len(OPERATORS))
+        self.rounds = 0
+
+        self.__records = []
+
+
+    @property
+    def decisions(self):
+        """
+        Returns the decisions so far as a DTYPE array
+        """
+
+        return np.array(self.__records, dtype=DTYPE)
+
+
+    def observe(self, operator, before, after, evaluations):
+        """
+        This method records one run of an operator
+        Args:
+        - operator = one of OPERATORS
+        - before, after = gbest cost before and after the operator
+        - evaluations = signals it simulated
+        """
+        k = OPERATORS.index(operator)
+
+        gain = (before - after) / before if before > 0 else 0.0
+
+        self.improvement[k] = self.discount * self.improvement[k] + max(gain, 0.0)
+        self.evaluations[k] = self.discount * self.evaluations[k] + evaluations
+        self.pulls[k] = self.discount * self.pulls[k] + 1
+
+        if k == 0:
+            self.rounds += 1
+
+
+    def rate(self, operator):
+        """
+        Returns the discounted relative improvement per evaluation
+        """
+        k = OPERATORS.index(operator)
+
+        return self.improvement[k] / self.evaluations[k] if self.evaluations[k] > 0 else 0.0
+
+
+    def score(self, operator):
+        """
+        Returns the upper confidence bound of the rate of an operator,
+        infinite until it has run once. The bonus is scaled by the best rate
+        so far, rates being tiny numbers
+        """
+        k = OPERATORS.index(operator)
+
+        if self.pulls[k] == 0:
+            return math.inf
+
+        scale = max(self.rate(name) for name in OPERATORS)
+        bonus = self.exploration * scale * math.sqrt(math.log(max(self.rounds, 1)) / self.pulls[k])
+
+        return self.rate(operator) + bonus
+
+
+    def budget(self, operator, iteration):
+        """
+        This method decides whether an operator runs this iteration
+        Args:
+        - operator = 'chaos' or 'ol'
+        - iteration = iteration number, for the log
+        Returns:
+        - repetitions of the chaotic search, 1 for orthogonal learning, or
+        0 if the operator is skipped
+        """
+        score = self.score(operator)
+        reference = self.rate('cpso')
+
+        if score < reference:
+            budget = 0
+        elif operator != 'chaos':
+            budget = 1
+        elif math.isinf(score) or reference == 0:
+            budget = self.rep
+        else:
+            budget = int(np.clip(round(self.rep * score / reference), self.min_rep, self.max_rep))
+
+        self.__records.append((iteration, OPERATORS.index(operator), budget, score, reference))
+
+        logger.debug('iteration %d: %s budget %d (score %.3g, cpso rate %.3g)',
+                     iteration, operator, budget, score, reference)
+
+        return budget
+
+
+    def state_dict(self):
+        """
+        Returns the statistics and decisions so far
+        """
+        state = super().state_dict()
+        state['decisions'] = self.decisions
+
+        return state
+
+
+    def load_state_dict(self, state):
+        """
+        Restores the state returned by state_dict
+        """
+
+        super().load_state_dict(state)
+
+        self.__records = np.array(state['decisions'], dtype=DTYPE).tolist()
@@ -0,0 +1,267 @@
+import functools
+
+import numpy as np
+import scipy
+from scipy import signal, linalg
+
+import soa_models
+import steady_state
+import upsampling
+
+
+# simulation backends selectable by the optimisers
+# - lsim2: adaptive ODE integration (scipy), linear interpolation of U.
+#          Removed from scipy 1.13, so only an opt-in where it still exists
+# - foh: exact discretisation for an input linearly interpolated between
+#        samples, i.e. the same input model as lsim2
+# - zoh: exact discretisation for an input held constant over each sample
+BACKENDS = ('lsim2', 'foh', 'zoh')
+
+LSIM2 = hasattr(signal, 'lsim2')
+
+# reference of validate(), lsim2 where it exists and otherwise scipy's
+# signal.lsim, which also interpolates U linearly
+REFERENCES = ('lsim2', 'lsim')
+REFERENCE = 'lsim2' if LSIM2 else 'lsim'
+
+# relative tolerance (max abs error / peak abs output) that a discrete backend
+# is held to by validate(). foh against a tight-tolerance integration agrees
+# to ~1e-10; against lsim2 with atol=1e-12 the gap is lsim2's own error, since
+# the SOA state vector is ~1e-90 and atol does not constrain it
+TOLERANCE = {'foh': 1e-2, 'zoh': 1e-1}
+
+CACHE_SIZE = 64
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _discretise(key, t0, t1, points, hold):
+
+    A, B, C, D, s = steady_state.balanced_ss(key)
+    n = A.shape[0]
+    dt = (t1 - t0) / (points - 1)
+
+    if hold == 'zoh':
+        M = np.zeros((n + 1, n + 1))
+        M[:n, :n] = A * dt
+        M[:n, n] = B[:, 0] * dt
+
+        E = linalg.expm(M)
+        Ad, B0, B1 = E[:n, :n], E[:n, n], np.zeros(n)
+
+    elif hold == 'foh':
+        M = np.zeros((n + 2, n + 2))
+        M[:n, :n] = A * dt
+        M[:n, n] = B[:, 0] * dt
+        M[n, n + 1] = 1.0
+
+        E = linalg.expm(M)
+        Ad, G1, G2 = E[:n, :n], E[:n, n], E[:n, n + 1]
+        # x[k+1] = Ad x[k] + G1 u[k] + G2 (u[k+1] - u[k])
+        B0, B1 = G1 - G2, G2
+
+    else:
+        raise ValueError(f'Unknown discretisation hold {hold}')
+
+    dsys = (np.ascontiguousarray(Ad), B0.copy(), B1.copy(), C[0].copy(), float(D[0, 0]), s)
+    for M in dsys[:4]:
+        M.flags.writeable = False
+
+    return dsys
+
+
+def discretise(tf, T, hold='foh'):
+    """
+    This method discretises a transfer function model on a uniform time grid.
+    Cached per (model, grid, hold), so only the first call per SOA pays for
+    the matrix exponential
+    Args:
+    - tf = transfer function
+    - T = array of uniformly spaced time values
+    - hold = 'foh' or 'zoh' input interpolation
+    Returns:
+    - (Ad, B0, B1, C, D, s) = x[k+1] = Ad x[k] + B0 u[k] + B1 u[k+1],
+    y[k] = C x[k] + D u[k], with states scaled by s (see steady_state)
+    """
+    T = np.asarray(T, dtype=float)
+    steps = np.diff(T)
+
+    if len(T) < 2 or not np.allclose(steps, steps[0], rtol=1e-9, atol=0):
+        raise ValueError('Discrete backends need a uniform time grid')
+
+    return _discretise(steady_state.model_key(tf), float(T[0]), float(T[-1]), len(T), hold)
+
+
+def simulate(tf, U, T, X0=None, backend='foh', atol=1e-12):
+    """
+    This method sends a drive signal to a transfer function model and gets
+    the output with the selected backend
+    Args:
+    - tf = transfer function
+    - U = signal to drive transfer function with, one sample per time value.
+    Discrete backends also accept a 2-D (signals x samples) array
+    - T = array of time values
+    - X0 = initial value (signal.lsim2 coordinates)
+    - backend = one of BACKENDS, or one of REFERENCES
+    - atol = scipy ode func parameter (lsim2 only)
+    Returns:
+    - PV = resultant output signal of transfer function
+    """
+
+    if backend == 'lsim2':
+        if not LSIM2:
+            raise ValueError(f'signal.lsim2 is not available in scipy {scipy.__version__}, use foh')
+
+        (_, PV, _) = signal.lsim2(tf, U, T, X0=X0, atol=atol)
+        return PV
+
+    if backend == 'lsim':
+        (_, PV, _) = signal.lsim(tf, U, T, X0=X0)
+        return PV
+
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown simulation backend {backend}')
+
+    (Ad, B0, B1, C, D, s) = discretise(tf, T, hold=backend)
+
+    U = np.asarray(U, dtype=float)
+    U2 = np.atleast_2d(U)
+    points = U2.shape[1]
+
+    if points != len(T):
+        raise ValueError(f'U has {points} samples but T has {len(T)}')
+
+    # input contribution to every state update, computed in one go
+    W = U2[:, :-1, None] * B0 + U2[:, 1:, None] * B1
+
+    X = np.empty((U2.shape[0], points, len(s)))
+    X[:, 0] = 0.0 if X0 is None else np.asarray(X0, dtype=float) / s
+    AdT = Ad.T
+
+    for k in range(points - 1):
+        X[:, k + 1] = X[:, k] @ AdT + W[:, k]
+
+    PV = X @ C + D * U2
+
+    return PV.reshape(U.shape)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _response_operator(key, m, t0, t1, points, X0, hold, mode):
+
+    tf = signal.TransferFunction(*key)
+    T = np.linspace(t0, t1, points)
+
+    # response to each control level on its own, from rest
+    R = upsampling.upsampling(points, mode).create(np.eye(m))
+    A = simulate(tf, R, T, X0=None, backend=hold).T
+
+    # free response from the initial state
+    b = simulate(tf, np.zeros(points), T, X0=X0, backend=hold)
+
+    A = np.ascontiguousarray(A)
+    A.flags.writeable = False
+    b.flags.writeable = False
+
+    return A, b
+
+
+def response_operator(tf, m, T, X0=None, hold='foh', mode='hold'):
+    """
+    This method builds the linear response operator of a transfer function
+    model for a drive signal of m levels upsampled to the time grid, so
+    that PV = A @ u + b. Cached per (model, m, grid, X0, hold, mode)
+    Args:
+    - tf = transfer function
+    - m = number of control levels
+    - T = array of uniformly spaced time values
+    - X0 = initial value (signal.lsim2 coordinates)
+    - hold = discretisation used to build the operator, 'foh' or 'zoh'
+    - mode = upsampling of the levels, see upsampling.MODES
+    Returns:
+    - A = (len(T) x m) response to each control level
+    - b = (len(T),) free response from X0
+    """
+    discretise(tf, T, hold=hold)
+
+    X0 = None if X0 is None else tuple(np.asarray(X0, dtype=float))
+
+    return _response_operator(steady_state.model_key(tf), m, float(T[0]), float(T[-1]), len(T), X0, hold, mode)
+
+
+def cascade_operators(tf, m, T, X0, hold='foh', mode='hold'):
+    """
+    This method builds the response operator of every SOA in a cascade. The
+    first SOA starts from X0 and each following SOA from the steady state of
+    the previous model, as in the optimisers
+    Args:
+    - tf = list of transfer functions, one per SOA
+    - m, T, hold, mode = as response_operator()
+    - X0 = initial value of the first SOA
+    Returns:
+    - list of (A, b) per SOA
+    """
+    operators = []
+
+    for j in range(len(tf)):
+        if j > 0:
+            X0 = steady_state.find_x_init(tf[j - 1])
+
+        operators.append(response_operator(tf[j], m, T, X0=X0, hold=hold, mode=mode))
+
+    return operators
+
+
+def cascade_output(operators, P):
+    """
+    This method simulates a whole population through a cascade of response
+    operators with one matrix multiply per SOA
+    Args:
+    - operators = output of cascade_operators()
+    - P = (particles x m*q) drive signals, SOA j uses columns j*m:(j+1)*m
+    Returns:
+    - PV = (particles x q x samples) outputs before any offset correction
+    """
+    P = np.atleast_2d(np.asarray(P, dtype=float))
+    m = operators[0][0].shape[1]
+
+    PV = np.empty((P.shape[0], len(operators), operators[0][0].shape[0]))
+
+    for j, (A, b) in enumerate(operators):
+        np.matmul(P[:, j * m:(j + 1) * m], A.T, out=PV[:, j])
+        PV[:, j] += b
+
+    return PV
+
+
+def validate(tf, U, T, X0=None, backend='foh', reference=REFERENCE, rtol=None):
+    """
+    This method checks a simulation backend against a reference backend
+    Args:
+    - tf, U, T, X0 = as simulate()
+    - backend = backend under test
+    - reference = backend taken as ground truth
+    - rtol = allowed error relative to peak output, TOLERANCE by default
+    Returns:
+    - (passed, err) = whether err <= rtol, max abs error / peak abs output
+    """
+    if rtol is None:
+        rtol = TOLERANCE[backend]
+
+    PV = simulate(tf, U, T, X0, backend=backend)
+    PV_ref = simulate(tf, U, T, X0, backend=reference)
+
+    err = np.max(np.abs(PV - PV_ref)) / np.max(np.abs(PV_ref))
+
+    return bool(err <= rtol), float(err)
+
+
+if __name__ == '__main__':
+    tf = soa_models.soa_tf()
+
+    T = np.linspace(0, 20e-9, 240)
+    X0 = steady_state.find_x_init(tf)
+
+    for m in (10, 40, 120):
+        U = np.repeat(np.random.uniform(-1, 1, m), 240 // m)
+        for backend in ('foh', 'zoh'):
+            print(m, backend, validate(tf, U, T, X0, backend=backend))
@@ -0,0 +1,699 @@
+import collections
+from concurrent import futures
+import hashlib
+import pickle
+import threading
+
+import numpy as np
+
+import cost_eval
+import profiling
+import response
+import simulation
+import steady_state
+import upsampling
+
+
+@profiling.timed('engine.simulate')
+def _stage_each(engine, U, j):
+    # one simulation per signal (lsim2)
+
+    inputs = engine.upsample(U)
+
+    return np.array([simulation.simulate(engine.sim_model[j], input, engine.T,
+                                         X0=engine.X0s[j], backend=engine.backend, atol=engine.atol)
+                     for input in inputs])
+
+
+@profiling.timed('engine.simulate')
+def _stage_batch(engine, U, j):
+    # every signal of the batch in one discrete simulation (foh/zoh)
+
+    return simulation.simulate(engine.sim_model[j], engine.upsample(U), engine.T,
+                               X0=engine.X0s[j], backend=engine.backend)
+
+
+@profiling.timed('engine.simulate')
+def _stage_operator(engine, U, j):
+    # precomputed response operator, one matrix multiply
+
+    A, b = engine.cascade()[j]
+
+    return U @ A.T + b
+
+
+# single SOA simulation of the built-in backends, each one maps the
+# (signals x m) slice U of SOA j to its (signals x samples) outputs before
+# the offset correction
+STAGES = {
+    'lsim2': _stage_each,
+    'foh': _stage_batch,
+    'zoh': _stage_batch,
+    'operator': _stage_operator,
+}
+
+
+def _simulate_stages(engine, P, PV):
+    # every particle of the batch through one SOA at a time
+
+    for j in range(engine.q):
+        PV[:, j] = STAGES[engine.backend](engine, P[:, j * engine.m:(j + 1) * engine.m], j)
+
+
+@profiling.timed('engine.simulate')
+def _simulate_operator(engine, P, PV):
+    # precomputed response operators, one matrix multiply per SOA
+
+    PV[:] = simulation.cascade_output(engine.cascade(), P)
+
+
+# simulation backends of the engine, each one fills a (particles x q x samples)
+# array with the outputs of the SOA cascade before the offset correction
+BACKENDS = {
+    'lsim2': _simulate_stages,
+    'foh': _simulate_stages,
+    'zoh': _simulate_stages,
+    'operator': _simulate_operator,
+}
+
+
+def register_backend(name, function):
+    """
+    This method adds a simulation backend to the engine
+    Args:
+    - name = backend label
+    - function = function(engine, P, PV) writing the outputs of the
+    (particles x m_c) drive signals P into the (particles x q x samples) PV.
+    The process executor sends it to its workers, so it must be picklable,
+    i.e. defined at the top level of a module
+    """
+
+    BACKENDS[name] = function
+
+
+# ways of spreading a batch over workers
+EXECUTORS = ('serial', 'thread', 'process')
+
+
+# engine of a process pool worker, built once by the pool initializer
+_worker_engine = None
+
+
+def _init_worker(config, backends):
+    # spawned workers only know the built-in backends, the ones added with
+    # register_backend are registered again
+
+    global _worker_engine
+
+    BACKENDS.update(backends)
+    _worker_engine = soa_engine(**config)
+
+
+def _evaluate_chunk(P, threshold=None):
+
+    return _worker_engine.evaluate_batch(P, threshold)
+
+
+# cost of a signal rejected by an early-terminated evaluation
+REJECTED = np.inf
+
+# margin on the rejection test so rounding in the running bound never
+# rejects a signal whose true cost equals the threshold
+_BOUND_RTOL = 1e-9
+
+
+class soa_engine:
+
+    def __init__(self,
+                sim_model,
+                t2,
+                X0,
+                m,
+                q,
+                cost_f,
+                st_importance_factor,
+                SP,
+                backend = 'foh',
+                samples = 240,
+                atol = 1e-12,
+                executor = 'serial',
+                workers = None,
+                chunk_size = 32,
+                cache = None,
+                early_termination = False,
+                block_size = None,
+                stage_cache = None,
+                upsampling_mode = 'hold',
+                fidelity = None):
+        '''
+        Simulation and cost engine for a cascade of SOAs, shared by the
+        optimisers so that the time grid, upsampler, initial states and
+        output buffers are set up once
+
+        Parameters:
+        - sim_model: transfer function for each SOA
+        - t2: time signal array
+        - X0: initial steady state value
+        - m: dimensions of control signal
+        - q: number of SOAs
+        - cost_f: cost function selected
+        - st_importance_factor: settling time importance factor
+        - SP: set point for each SOA, a signal of samples points or a
+          constant level
+        - backend: simulation backend, see BACKENDS
+        - samples: number of points the drive signal is upsampled to
+        - atol: scipy ode func parameter (lsim2 backend only)
+        - executor: 'serial', 'thread' or 'process' evaluation of batches
+        - workers: number of threads/processes, all cores if None
+        - chunk_size: particles per task. Batches are split into the same
+          chunks whatever the executor, so costs are bit-identical to serial
+        - cache: optional eval_cache.cost_cache consulted before simulating.
+          Its keys include the fingerprint of the engine, so engines with
+          different configurations can share it
+        - early_termination: stop the simulation of a signal once its cost
+          is known to exceed the threshold passed to evaluate_batch (cost
+          functions in cost_eval.BOUNDS only) and return REJECTED for it.
+          Signals simulated to the end keep their exact cost. Callers only
+          see how far above the threshold a signal was without it, so runs
+          may differ: cpso_sk does not adapt its coefficients to rejected
+          moves and the chaos surrogate is not trained on them
+        - block_size: samples between two bound checks, once per SOA if None.
+          Only the operator backend can stop part way through an SOA, the
+          others simulate it whole before checking
+        - stage_cache: optional eval_cache.cost_cache of the cost of each
+          SOA keyed on its slice of the signal, so only the SOAs whose slice
+          changed are simulated. Evaluates in this process, ignoring the
+          executor and early termination
+        - upsampling_mode: 'hold' or 'linear' upsampling of the drive
+          signal, see upsampling.MODES
+        - fidelity: optional ladder of (samples, margin) levels, coarsest
+          first. Signals evaluated with a threshold are first simulated on
+          each coarse grid in turn and only go on if their cost there is at
+          most margin * threshold, the others get the cost REJECTED. Calls
+          without a threshold, and every returned finite cost, are at full
+          resolution. Margins must allow for the coarse grid error of the
+          cost function, e.g. 1.5 for mSE on 60 of 240 samples
+        '''
+
+        if backend not in BACKENDS:
+            raise ValueError(f'Unknown simulation backend {backend}')
+
+        if executor not in EXECUTORS:
+            raise ValueError(f'Unknown executor {executor}')
+
+        self.sim_model = sim_model
+        self.t2 = t2
+        self.X0 = X0
+        self.m = m
+        self.q = q
+        self.m_c = self.m * self.q
+        self.cost_f = cost_f
+        self.st_importance_factor = st_importance_factor
+        # one set point signal per SOA, constant levels repeated over the grid
+        self.SP = np.array([np.broadcast_to(np.asarray(sp, dtype=float), samples) for sp in SP[:q]])
+        self.backend = backend
+        self.samples = samples
+        self.atol = atol
+        self.executor = executor
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache = cache
+        self.early_termination = early_termination
+        self.block_size = block_size or samples
+        self.stage_cache = stage_cache
+
+        self.T = np.linspace(t2[0], t2[-1], samples)
+
+        self.upsampler = upsampling.upsampling(samples, upsampling_mode)
+
+        # the first SOA starts from X0, the others from the steady state
+        # of the previous model
+        self.X0s = [X0] + [steady_state.find_x_init(tf) for tf in sim_model[:self.q - 1]]
+
+        self.operators = None
+
+        # number of signals simulated so far (cache hits excluded), and how
+        # many of them were rejected before the end of the cascade
+        self.evaluations = 0
+        self.rejections = 0
+
+        # number of single SOA simulations of the stage cache path
+        self.stage_evaluations = 0
+
+        # coarse engines of the fidelity ladder with their margins, the
+        # signals they simulated and the signals they screened out
+        self.coarse = [(self.__coarse_engine(points), margin) for points, margin in fidelity or ()]
+        self.coarse_evaluations = 0
+        self.screened = 0
+
+        # optional budget.budget the optimisers check between evaluations
+        self.budget = None
+
+        # configuration the cache keys are salted with
+        self.digest = self.fingerprint()
+
+        self.__PV = np.zeros((1, self.q, self.samples))
+
+        # upsampled drive signals, one buffer per thread since the thread
+        # executor simulates several chunks at once
+        self.__buffers = threading.local()
+
+        self.__pool = None
+
+
+    def config(self):
+        """
+        Returns the parameters needed to rebuild this engine in a worker
+        """
+
+        return dict(sim_model=self.sim_model, t2=self.t2, X0=self.X0, m=self.m, q=self.q,
+                    cost_f=self.cost_f, st_importance_factor=self.st_importance_factor,
+                    SP=self.SP, backend=self.backend, samples=self.samples, atol=self.atol,
+                    chunk_size=self.chunk_size, early_termination=self.early_termination,
+                    block_size=self.block_size, upsampling_mode=self.upsampler.mode)
+
+
+    def fingerprint(self):
+        """
+        Returns a digest of everything a cost depends on besides the drive
+        signal: models, time grid, initial state, set points, cost function
+        and simulation settings
+        """
+        h = hashlib.blake2b(digest_size=16)
+
+        h.update(repr([steady_state.model_key(tf) for tf in self.sim_model[:self.q]]).encode())
+        h.update(repr((self.m, self.q, self.cost_f, self.st_importance_factor, self.backend, self.samples,
+                       self.atol, self.upsampler.mode)).encode())
+
+        for array in [self.t2, self.X0, self.SP]:
+            h.update(np.ascontiguousarray(array, dtype=float).tobytes())
+
+        return h.digest()
+
+
+    def batched(self):
+        """
+        Returns True if a batch costs about as much as one signal, so the
+        optimisers may simulate candidates ahead of their turn. A serial
+        lsim2 engine simulates the signals of a batch one at a time
+        """
+
+        return STAGES.get(self.backend) is not _stage_each or self.executor != 'serial'
+
+
+    def cascade(self):
+        """
+        Returns the (A, b) response operators of the SOAs, built on first use
+        """
+
+        if self.operators is None:
+            self.operators = simulation.cascade_operators(self.sim_model, self.m, self.T, self.X0,
+                                                          mode=self.upsampler.mode)
+
+        return self.operators
+
+
+    def upsample(self, U):
+        """
+        This method upsamples every row of a (signals x m) array into a
+        buffer reused while batch sizes repeat, valid until the next call
+        from the same thread
+        """
+        U = np.asarray(U, dtype=float)
+        out = getattr(self.__buffers, 'U', None)
+
+        if out is None or out.shape[0] != U.shape[0]:
+            out = self.__buffers.U = np.empty((U.shape[0], self.samples))
+
+        return self.upsampler.create(U, out=out)
+
+
+    def outputs(self, P, out=None):
+        """
+        This method sends a population of drive signals through the SOA
+        cascade and gets the outputs
+        Args:
+        - P = (particles x m_c) drive signals, SOA j uses columns j*m:(j+1)*m
+        - out = optional (particles x q x samples) array to write into
+        Returns:
+        - PV = (particles x q x samples) resultant output signals
+        """
+        P = np.atleast_2d(np.asarray(P, dtype=float))
+
+        if out is None:
+            out = np.empty((P.shape[0], self.q, self.samples))
+
+        BACKENDS[self.backend](self, P, out)
+
+        # ensure lower point of signal >= 0 (can occur for sims), otherwise
+        # will destroy st, os and rt analysis
+        out -= np.minimum(out.min(axis=2, keepdims=True), 0)
+
+        return out
+
+
+    def responses(self, P, **kwargs):
+        """
+        This method measures the step response of every SOA output of a
+        population, see response.measure for the keyword arguments
+        Returns:
+        - (rt, st, os, st_index), each (particles x q)
+        """
+
+        return response.measure(self.outputs(P), self.T, **kwargs)
+
+
+    @profiling.timed('engine.evaluate_batch')
+    def evaluate_batch(self, P, threshold=None):
+        """
+        This method evaluates the cost of a population of drive signals.
+        Signals found in the cache are not simulated again, the rest are
+        spread over the workers of the executor
+        Args:
+        - P = (particles x m_c) drive signals
+        - threshold = optional scalar or (particles,) costs above which a
+        signal is of no use to the caller. With early_termination or a
+        fidelity ladder, a signal whose evaluation stops before its full
+        resolution cost is known gets the cost REJECTED. Every other
+        signal gets its exact cost, above the threshold or not
+        Returns:
+        - costs = (particles,) cost summed over the SOAs
+        """
+        P = np.atleast_2d(np.asarray(P, dtype=float))
+
+        if threshold is not None:
+            threshold = np.broadcast_to(np.asarray(threshold, dtype=float), P.shape[:1])
+
+        if self.cache is None:
+            costs = self.__screen_costs(P, threshold)
+        else:
+            costs = self.__cached_costs(P, threshold)
+
+        return costs
+
+
+    def __cached_costs(self, P, threshold=None):
+        # looks every signal up in the cache, the others are simulated
+
+        costs = np.empty(P.shape[0])
+        # rows to simulate, one per distinct signal not in the cache
+        todo = collections.OrderedDict()
+
+        for i, p in enumerate(P):
+            key = self.cache.key(p, config=self.digest)
+            cost = self.cache.get(key)
+
+            if cost is None:
+                todo.setdefault(key, []).append(i)
+            else:
+                costs[i] = cost
+
+        if todo:
+            rows = [idxs[0] for idxs in todo.values()]
+
+            if threshold is None:
+                new_costs = self.__screen_costs(P[rows])
+            else:
+                # duplicates share the loosest threshold among them
+                limits = np.array([threshold[idxs].max() for idxs in todo.values()])
+                new_costs = self.__screen_costs(P[rows], limits)
+
+            for (key, idxs), cost in zip(todo.items(), new_costs):
+                # a rejected signal has no cost to remember
+                if cost != REJECTED:
+                    self.cache.put(key, cost)
+
+                costs[idxs] = cost
+
+        return costs
+
+
+    def __screen_costs(self, P, threshold=None):
+        # climbs the fidelity ladder, only the signals that stay within
+        # margin * threshold on every coarse grid are simulated in full
+
+        if threshold is None or not self.coarse:
+            return self.__simulate_costs(P, threshold)
+
+        keep = np.ones(P.shape[0], dtype=bool)
+
+        for engine, margin in self.coarse:
+            rows = np.flatnonzero(keep)
+
+            if not rows.size:
+                break
+
+            self.coarse_evaluations += rows.size
+            keep[rows] = engine.evaluate_batch(P[rows]) <= margin * threshold[rows]
+
+        self.screened += int(np.count_nonzero(~keep))
+
+        costs = np.full(P.shape[0], REJECTED)
+
+        if keep.any():
+            costs[keep] = self.__simulate_costs(P[keep], threshold[keep])
+
+        return costs
+
+
+    def __coarse_engine(self, points):
+        # serial engine on a coarser grid of the same span, with the set
+        # points sampled on it
+
+        T = np.linspace(self.t2[0], self.t2[-1], points)
+        SP = [np.interp(T, np.linspace(self.t2[0], self.t2[-1], self.samples), sp) for sp in self.SP]
+
+        return soa_engine(**dict(self.config(), t2=T, SP=SP, samples=points, block_size=None))
+
+
+    def __simulate_costs(self, P, threshold=None):
+
+        if not self.early_termination or self.cost_f not in cost_eval.BOUNDS \
+                or self.backend not in STAGES:
+            threshold = None
+
+        self.evaluations += P.shape[0]
+
+        chunks = [P[i:i + self.chunk_size] for i in range(0, P.shape[0], self.chunk_size)]
+
+        if threshold is None:
+            limits = [None] * len(chunks)
+        else:
+            limits = [threshold[i:i + self.chunk_size] for i in range(0, P.shape[0], self.chunk_size)]
+
+        if not chunks:
+            return np.zeros(0)
+
+        if self.stage_cache is not None and self.backend in STAGES:
+            return self.__cached_stages(P)
+
+        if self.executor == 'serial' or len(chunks) < 2:
+            costs = [self.__evaluate(chunk, limit) for chunk, limit in zip(chunks, limits)]
+
+        elif self.executor == 'thread':
+            # build shared state before threads use it
+            if self.backend == 'operator':
+                self.cascade()
+
+            costs = list(self.__executor().map(self.__evaluate_threaded, chunks, limits))
+
+        else:
+            costs = list(self.__executor().map(_evaluate_chunk, chunks, limits))
+
+        costs = np.concatenate(costs)
+
+        self.rejections += int(np.count_nonzero(costs == REJECTED))
+
+        return costs
+
+
+    def __evaluate(self, P, threshold=None):
+
+        if threshold is not None:
+            return self.__stream(P, threshold)
+
+        # reuse the output buffer while batch sizes repeat
+        if self.__PV.shape[0] != P.shape[0]:
+            self.__PV = np.empty((P.shape[0], self.q, self.samples))
+
+        PV = self.outputs(P, out=self.__PV)
+
+        return cost_eval.batch_cost(self.t2, PV, self.cost_f, self.st_importance_factor, self.SP)
+
+
+    def __evaluate_threaded(self, P, threshold=None):
+
+        if threshold is not None:
+            return self.__stream(P, threshold)
+
+        PV = self.outputs(P)
+
+        return cost_eval.batch_cost(self.t2, PV, self.cost_f, self.st_importance_factor, self.SP)
+
+
+    def __cached_stages(self, P):
+        # simulates only the SOA slices missing from the stage cache, the
+        # SOAs of the cascade are independent given their initial states
+
+        costs = np.empty((P.shape[0], self.q))
+
+        for j in range(self.q):
+            U = P[:, j * self.m:(j + 1) * self.m]
+
+            # rows to simulate, one per distinct slice not in the cache
+            todo = collections.OrderedDict()
+
+            for i, u in enumerate(U):
+                key = self.stage_cache.key(u, j, config=self.digest)
+                cost = self.stage_cache.get(key)
+
+                if cost is None:
+                    todo.setdefault(key, []).append(i)
+                else:
+                    costs[i, j] = cost
+
+            if not todo:
+                continue
+
+            rows = [idxs[0] for idxs in todo.values()]
+
+            y = STAGES[self.backend](self, U[rows], j)
+            y -= np.minimum(y.min(axis=1, keepdims=True), 0)
+
+            new_costs = cost_eval.stage_costs(self.t2, y[:, None], self.cost_f,
+                                              self.st_importance_factor, self.SP[j:j + 1])[:, 0]
+
+            self.stage_evaluations += len(rows)
+
+            for (key, idxs), cost in zip(todo.items(), new_costs):
+                self.stage_cache.put(key, cost)
+                costs[idxs, j] = cost
+
+        return costs.sum(axis=1)
+
+
+    def __stream(self, P, threshold):
+        # simulates one SOA at a time, and for the operator backend one
+        # block of samples at a time, dropping every signal whose cost bound
+        # already exceeds its threshold
+
+        costs = np.full(P.shape[0], REJECTED)
+        PV = np.empty((P.shape[0], self.q, self.samples))
+
+        # signals still running, with their thresholds and finished SOA costs
+        rows = np.arange(P.shape[0])
+        limit = threshold * (1 + _BOUND_RTOL)
+        total = np.zeros(P.shape[0])
+
+        for j in range(self.q):
+            U = P[rows, j * self.m:(j + 1) * self.m]
+
+            if self.backend == 'operator':
+                A, b = self.cascade()[j]
+            else:
+                Y = STAGES[self.backend](self, U, j)
+
+            bound = cost_eval.BOUNDS[self.cost_f](rows.size, self.samples)
+
+            for start in range(0, self.samples, self.block_size):
+                stop = min(start + self.block_size, self.samples)
+
+                if self.backend == 'operator':
+                    y = U @ A[start:stop].T + b[start:stop]
+                else:
+                    y = Y[:, start:stop]
+
+                PV[rows, j, start:stop] = y
+
+                # a signal simulated to the end keeps its exact cost
+                if j == self.q - 1 and stop == self.samples:
+                    break
+
+                bound.update(y, self.SP[j, start:stop])
+
+                keep = total + bound.lower() <= limit
+
+                if not keep.all():
+                    rows, total, limit, U = rows[keep], total[keep], limit[keep], U[keep]
+                    bound.take(keep)
+
+                    if self.backend != 'operator':
+                        Y = Y[keep]
+
+                    if not rows.size:
+                        return costs
+
+            # exact cost of the finished SOA
+            y = PV[rows, j]
+            y -= np.minimum(y.min(axis=1, keepdims=True), 0)
+            total = total + cost_eval.batch_cost(self.t2, y[:, None], self.cost_f,
+                                                 self.st_importance_factor, self.SP[j:j + 1])
+
+        PV = PV[rows]
+        PV -= np.minimum(PV.min(axis=2, keepdims=True), 0)
+
+        costs[rows] = cost_eval.batch_cost(self.t2, PV, self.cost_f, self.st_importance_factor, self.SP)
+
+        return costs
+
+
+    def __executor(self):
+
+        if self.__pool is None:
+            if self.executor == 'thread':
+                self.__pool = futures.ThreadPoolExecutor(max_workers=self.workers)
+
+            else:
+                backends = {self.backend: BACKENDS[self.backend]}
+
+                try:
+                    pickle.dumps(backends)
+                except (pickle.PicklingError, AttributeError, TypeError) as e:
+                    raise ValueError(f'Backend {self.backend} cannot be sent to worker processes, define it at '
+                                     f'the top level of a module or use the thread executor') from e
+
+                self.__pool = futures.ProcessPoolExecutor(max_workers=self.workers,
+                                                          initializer=_init_worker,
+                                                          initargs=(self.config(), backends))
+
+        return self.__pool
+
+
+    def close(self):
+        """
+        Shuts down the worker pool, if one was started
+        """
+
+        if self.__pool is not None:
+            self.__pool.shutdown()
+            self.__pool = None
+
+
+    def __enter__(self):
+
+        return self
+
+
+    def __exit__(self, *args):
+
+        self.close()
+
+
+    def exhausted(self):
+        """
+        Returns the limit of the budget that is reached, None if there is
+        no budget or it is not spent
+        """
+
+        if self.budget is None:
+            return None
+
+        return self.budget.exhausted(self.evaluations)
+
+
+    def get_cost(self, p):
+        """
+        This method evaluates the cost of a single drive signal
+        """
+
+        return self.evaluate_batch(np.atleast_2d(p))[0]
@@ -0,0 +1,50 @@
+import numpy as np
+from scipy import signal
+
+import steady_state
+
+
+# 10th order (9 poles) SOA equivalent circuit transfer function
+num = [2.01199757841099e85]
+den = [
+    1.64898505756825e0,
+    4.56217233166632e10,
+    3.04864287973918e21,
+    4.76302109455371e31,
+    1.70110870487715e42,
+    1.36694076792557e52,
+    2.81558045148153e62,
+    9.16930673102975e71,
+    1.68628748250276e81,
+    2.40236028415562e90,
+]
+
+
+def soa_tf():
+    """
+    Returns the SOA transfer function model
+    """
+
+    return signal.TransferFunction(num, den)
+
+
+def step_problem(q, samples = 240, t_stop = 20e-9, step_at = 60):
+    """
+    This method sets up a synthetic problem on the SOA model: every SOA of
+    the cascade must step from the -1 steady state to the +1 steady state
+    Args:
+    - q = number of SOAs
+    - samples = number of points of the time grid
+    - t_stop = end of the time grid
+    - step_at = sample of the step
+    Returns:
+    - dict of sim_model, t2, X0 and SP, as taken by the optimisers
+    """
+    tf = soa_tf()
+
+    dc = num[-1] / den[-1]
+    SP = np.full(samples, dc)
+    SP[:step_at] = - dc
+
+    return dict(sim_model = [tf] * q, t2 = np.linspace(0, t_stop, samples),
+                X0 = steady_state.find_x_init(tf), SP = [SP] * q)
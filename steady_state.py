@@ -0,0 +1,101 @@
+import functools
+
+import numpy as np
+from scipy import signal, linalg
+
+import profiling
+
+
+# number of distinct SOA models kept in memory at once
+CACHE_SIZE = 32
+
+
+def model_key(tf):
+    """
+    This method returns a hashable key for a transfer function model so that
+    results derived from it can be memoised
+    Args:
+    - tf = transfer function
+    Returns:
+    - key = (numerator coefficients, denominator coefficients)
+    """
+    num = np.atleast_1d(np.squeeze(np.asarray(tf.num, dtype=float)))
+    den = np.atleast_1d(np.asarray(tf.den, dtype=float))
+
+    return (tuple(num), tuple(den))
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def balanced_ss(key):
+    """
+    This method returns the state-space realisation used by signal.lsim2
+    together with a diagonally rescaled copy of it. The SOA models have
+    denominator coefficients spanning ~90 orders of magnitude, so the raw
+    companion form is far too badly scaled to solve or exponentiate directly.
+    Args:
+    - key = model key from model_key()
+    Returns:
+    - (A, B, C, D) = balanced state-space matrices
+    - s = scaling, x_balanced = x / s where x is in signal.lsim2 coordinates
+    """
+    num, den = key
+    A, B, C, D = signal.tf2ss(num, den)
+
+    with np.errstate(invalid='ignore'):
+        A, S = linalg.matrix_balance(A, permute=False)
+    s = np.diag(S).copy()
+
+    B = B / s[:, None]
+    C = C * s[None, :]
+
+    for M in (A, B, C, D, s):
+        M.flags.writeable = False
+
+    return A, B, C, D, s
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def _steady_state(key, u):
+
+    A, B, _, _, s = balanced_ss(key)
+
+    # equilibrium of dx/dt = Ax + Bu for constant u
+    X0 = - np.linalg.solve(A, B[:, 0] * u) * s
+    X0.flags.writeable = False
+
+    return X0
+
+
+@profiling.timed('steady_state.find_x_init')
+def find_x_init(tf, u=-1.0):
+    """
+    This method calculates the steady state-vector of a transfer function
+    model driven by a constant signal. It replaces simulating a long -1 drive
+    signal with signal.lsim2 and is memoised per model, so repeated calls for
+    the same SOA cost a dictionary lookup
+    Args:
+    - tf = transfer function
+    - u = constant drive level
+    Returns:
+    - X0 = system's state-vector result for steady state (signal.lsim2
+    coordinates)
+    """
+
+    return np.copy(_steady_state(model_key(tf), float(u)))
+
+
+def cache_info():
+    """
+    Returns hit/miss statistics of the steady state cache
+    """
+
+    return _steady_state.cache_info()
+
+
+def cache_clear():
+    """
+    Empties the steady state and realisation caches
+    """
+
+    _steady_state.cache_clear()
+    balanced_ss.cache_clear()
@@ -0,0 +1,185 @@
+import numpy as np
+from scipy.spatial import distance
+
+
+class rbf_surrogate:
+
+    def __init__(self, size = 200, smoothing = 1e-9, min_points = 10):
+        '''
+        Radial basis function model of the cost, fitted on the latest true
+        evaluations, that ranks candidates before they are simulated. It
+        models log(cost), costs spanning many decades, with a linear kernel
+        and a constant tail so any number of points is enough to fit
+
+        The inverse of the interpolation system is updated as evaluations
+        arrive and leave the window (bordered inverse updates, O(size^2)
+        each) instead of solving the system again. It is recomputed in full
+        once size updates have accumulated, so rounding cannot build up
+
+        Parameters:
+        - size: number of latest evaluations the model is fitted on
+        - smoothing: regularisation of the fit, keeps close signals solvable
+        - min_points: evaluations needed before predict() answers
+        '''
+
+        self.size = size
+        self.smoothing = smoothing
+        self.min_points = min_points
+
+        self.P = None
+        self.costs = np.zeros(0)
+
+        # inverse of the interpolation system, the constant tail first and
+        # then the points of the window, and the updates since its last
+        # full computation
+        self.__inverse = None
+        self.__updates = 0
+        self.__weights = None
+
+
+    def __len__(self):
+
+        return self.costs.size
+
+
+    def observe(self, P, costs):
+        """
+        This method adds true evaluations of new signals, dropping the
+        oldest ones beyond size. Rejected (infinite) costs and signals
+        already observed are left out
+        Args:
+        - P = (signals x m_c) drive signals
+        - costs = (signals,) their costs
+        """
+        P = np.atleast_2d(np.asarray(P, dtype=float))
+        costs = np.asarray(costs, dtype=float).ravel()
+
+        valid = np.isfinite(costs) & (costs > 0)
+        P, costs = P[valid], costs[valid]
+
+        # a repeated signal adds nothing to the interpolant but makes the
+        # updated inverse singular, only new signals are kept
+        first = np.sort(np.unique(P, axis = 0, return_index = True)[1])
+        P, costs = P[first], costs[first]
+
+        if self.P is not None and costs.size:
+            new = distance.cdist(P, self.P).min(axis = 1) > 0
+            P, costs = P[new], costs[new]
+
+        P, costs = P[-self.size:], costs[-self.size:]
+
+        if not costs.size:
+            return
+
+        if self.P is None:
+            self.P, self.costs = P, costs
+            return
+
+        drop = max(len(self) + costs.size - self.size, 0)
+
+        if drop >= len(self):
+            self.__inverse = None
+
+        self.__remove_oldest(drop)
+        self.__add(P)
+
+        self.P = np.concatenate([self.P, P])
+        self.costs = np.concatenate([self.costs, costs])
+
+        self.__weights = None
+
+
+    def predict(self, P):
+        """
+        This method predicts the cost of candidate signals
+        Args:
+        - P = (signals x m_c) drive signals
+        Returns:
+        - (signals,) predicted costs, None until min_points are observed
+        """
+
+        if len(self) < self.min_points:
+            return None
+
+        if self.__inverse is None or self.__updates >= self.size:
+            self.__fit()
+
+        if self.__weights is None:
+            self.__weights = self.__inverse @ np.concatenate([[0.0], np.log(self.costs)])
+
+        P = np.atleast_2d(np.asarray(P, dtype=float))
+
+        return np.exp(self.__weights[0] - distance.cdist(P, self.P) @ self.__weights[1:])
+
+
+    def state_dict(self):
+        """
+        Returns the observed evaluations
+        """
+
+        return {'P': np.zeros((0, 0)) if self.P is None else np.copy(self.P), 'costs': np.copy(self.costs)}
+
+
+    def load_state_dict(self, state):
+        """
+        Restores the state returned by state_dict
+        """
+
+        self.costs = np.copy(state['costs'])
+        self.P = np.copy(state['P']) if self.costs.size else None
+        self.__inverse = self.__weights = None
+
+
+    def __fit(self):
+        # full inverse of [[0, 1'], [1, K + smoothing I]], K = - |p_i - p_j|
+
+        n = len(self)
+
+        system = np.zeros((n + 1, n + 1))
+        system[0, 1:] = system[1:, 0] = 1.0
+        system[1:, 1:] = self.smoothing * np.eye(n) - distance.cdist(self.P, self.P)
+
+        self.__inverse = np.linalg.inv(system)
+        self.__updates = 0
+        self.__weights = None
+
+
+    def __add(self, P):
+        # bordered inverse of the system with the new points, from the
+        # Schur complement of their rows
+
+        if self.__inverse is None:
+            return
+
+        U = np.ones((len(self) + 1, len(P)))
+        U[1:] = - distance.cdist(self.P, P)
+        BU = self.__inverse @ U
+        schur = np.linalg.inv(self.smoothing * np.eye(len(P)) - distance.cdist(P, P) - U.T @ BU)
+        BUS = BU @ schur
+
+        n = U.shape[0]
+        inverse = np.empty((n + len(P), n + len(P)))
+        inverse[:n, :n] = self.__inverse + BUS @ BU.T
+        inverse[:n, n:] = - BUS
+        inverse[n:, :n] = - BUS.T
+        inverse[n:, n:] = schur
+
+        self.__inverse = inverse
+        self.__updates += len(P)
+
+
+    def __remove_oldest(self, drop):
+        # inverse of the system without its first drop points, the rows
+        # after the constant tail, by the inverse of their block
+
+        self.P, self.costs = self.P[drop:], self.costs[drop:]
+
+        if self.__inverse is None or not drop:
+            return
+
+        B = self.__inverse
+        rows = slice(1, drop + 1)
+        F = np.delete(B[:, rows], rows, axis = 0)
+
+        self.__inverse = np.delete(np.delete(B, rows, axis = 0), rows, axis = 1) - F @ np.linalg.solve(B[rows, rows], F.T)
+        self.__updates += drop
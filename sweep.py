@@ -0,0 +1,272 @@
+import argparse
+import collections
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+import traceback
+from multiprocessing import connection
+
+import numpy as np
+
+import driver
+import result_store
+import soa_models
+
+
+# optional stages of driver.hybrid_pso used by each algorithm
+ALGORITHMS = {
+    'cpso': dict(use_chaos = False, use_ol = False, use_regroup = False),
+    'cpso_regroup': dict(use_chaos = False, use_ol = False),
+    'cpso_chaos': dict(use_ol = False),
+    'cpso_ol': dict(use_chaos = False, use_regroup = False),
+    'hybrid': dict(),
+}
+
+# parameters swept by grid()
+GRID = ('m', 'q', 'cost_f', 'st_importance_factor', 'algorithm')
+
+# columns of the results table, after the swept and fixed parameters
+COLUMNS = ('status', 'attempts', 'error', 'gbest_cost', 'rise_time', 'settling_time', 'overshoot',
+           'settling_index', 'evaluations', 'iterations', 'stop_reason', 'duration')
+
+# array valued results of a job, kept in the result store only
+SIGNALS = ('drive', 'PV', 't')
+
+
+def factors(n, minimum = 1):
+    """
+    Returns the factors of n from minimum up, the dimensions m whose
+    levels all last the same number of points
+    """
+
+    return [i for i in range(minimum, n + 1) if n % i == 0]
+
+
+def grid(m, q = (1,), cost_f = ('mSE',), st_importance_factor = (1,), algorithm = ('hybrid',), **fixed):
+    """
+    This method builds the configurations of a sweep
+    Args:
+    - m, q, cost_f, st_importance_factor, algorithm = values to sweep, every
+    combination becomes one job
+    - fixed = parameters shared by every job (n, iter_max, backend, seed...)
+    Returns:
+    - list of configuration dicts
+    """
+
+    return [dict(zip(GRID, values), **fixed)
+            for values in itertools.product(m, q, cost_f, st_importance_factor, algorithm)]
+
+
+def run_job(config):
+    """
+    This method optimises the drive signal of one configuration
+    Args:
+    - config = configuration from grid()
+    Returns:
+    - dict of measurements of the optimised output, with the optimised
+    drive signal, the output of the last SOA and its time grid as the
+    SIGNALS arrays
+    """
+    start = time.perf_counter()
+
+    config = dict(config)
+    m, q, algorithm = config.pop('m'), config.pop('q'), config.pop('algorithm')
+    samples = config.pop('samples', 240)
+
+    if algorithm not in ALGORITHMS:
+        raise ValueError(f'Unknown algorithm {algorithm}')
+
+    config.setdefault('n', 20)
+    config.setdefault('iter_max', 50)
+    config.setdefault('backend', 'foh')
+
+    problem = soa_models.step_problem(q, samples = samples)
+
+    pso = driver.hybrid_pso(m = m, q = q, **problem, **ALGORITHMS[algorithm], **config)
+    pso.run()
+
+    result = pso.result()
+
+    # measurements of the output of the last SOA
+    return dict(gbest_cost = result['gbest_cost'], rise_time = float(result['rise_time'][-1]),
+                settling_time = float(result['settling_time'][-1]), overshoot = float(result['overshoot'][-1]),
+                settling_index = int(result['settling_index'][-1]), evaluations = result['evaluations'],
+                iterations = result['iterations'], stop_reason = result['stop_reason'],
+                duration = time.perf_counter() - start,
+                drive = np.asarray(result['gbest'], dtype=float).ravel(), PV = result['PV'], t = result['t'])
+
+
+def _set_limits(cpu_limit, memory_limit):
+
+    import resource
+
+    if cpu_limit is not None:
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_limit, cpu_limit))
+
+    if memory_limit is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+
+def _worker(config, limits, conn):
+    # entry point of a job process, reports ('ok', result) or ('error', traceback)
+
+    try:
+        _set_limits(*limits)
+        conn.send(('ok', run_job(config)))
+
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+
+    finally:
+        conn.close()
+
+
+def sweep(configs, workers = None, retries = 1, timeout = None, cpu_limit = None, memory_limit = None,
+          store = None, chunk_size = 64):
+    """
+    This method runs every configuration in its own process, at most
+    workers at a time
+    Args:
+    - configs = configurations from grid()
+    - workers = number of jobs run at once, all cores if None
+    - retries = times a job is run again after its process died or timed
+    out. Exceptions raised by a job are not retried, they would recur
+    - timeout = wall clock seconds before a job is killed
+    - cpu_limit, memory_limit = CPU seconds and address space bytes of each
+    job process (RLIMIT_CPU, RLIMIT_AS)
+    - store = result_store.result_store opened for appending. Every
+    finished record is added with its job index as the job column, in
+    chunks of chunk_size records
+    Returns:
+    - list of result records in the order of configs
+    """
+    workers = workers or os.cpu_count()
+
+    # a fresh interpreter per job, so limits and crashes stay in the job
+    context = multiprocessing.get_context('spawn')
+
+    pending = collections.deque((i, 1) for i in range(len(configs)))
+    running = {}
+    results = [None] * len(configs)
+    finished = []
+
+    while pending or running:
+
+        while pending and len(running) < workers:
+            i, attempt = pending.popleft()
+
+            receiver, sender = context.Pipe(duplex = False)
+            process = context.Process(target = _worker, args = (configs[i], (cpu_limit, memory_limit), sender),
+                                      daemon = True)
+            process.start()
+            sender.close()
+
+            running[i] = (process, receiver, time.monotonic(), attempt)
+
+        connection.wait([r for (_, r, _, _) in running.values()], timeout = 0.1)
+
+        for i, (process, receiver, start, attempt) in list(running.items()):
+
+            if receiver.poll():
+                try:
+                    status, payload = receiver.recv()
+                except EOFError:
+                    process.join()
+                    status, payload = 'crashed', f'job process exited with code {process.exitcode}'
+
+            elif timeout is not None and time.monotonic() - start > timeout:
+                process.terminate()
+                status, payload = 'timeout', f'killed after {timeout} s'
+
+            else:
+                continue
+
+            process.join()
+            receiver.close()
+            del running[i]
+
+            if status in ('crashed', 'timeout') and attempt <= retries:
+                pending.append((i, attempt + 1))
+                continue
+
+            record = dict(configs[i], status = status, attempts = attempt, error = '')
+
+            if status == 'ok':
+                record.update(payload)
+            else:
+                record['error'] = payload
+
+            results[i] = record
+
+            if store is not None:
+                finished.append(dict(record, job = i))
+
+                if len(finished) >= chunk_size:
+                    store.append(finished)
+                    finished = []
+
+    if store is not None:
+        store.append(finished)
+
+    return results
+
+
+def write_table(path, results):
+    """
+    This method writes the result records to a CSV file, one row per job.
+    Signals are left out, they only go to the result store
+    """
+    names = []
+
+    for record in results:
+        names += [name for name in record if name not in names and name not in COLUMNS and name not in SIGNALS]
+
+    names += COLUMNS
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames = names, restval = '')
+        writer.writeheader()
+        writer.writerows({name: value for name, value in record.items() if name not in SIGNALS}
+                         for record in results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'Optimise the SOA drive signal over a grid of configurations')
+    parser.add_argument('--m', type = int, nargs = '+', default = factors(240, minimum = 11))
+    parser.add_argument('--q', type = int, nargs = '+', default = [1])
+    parser.add_argument('--cost-f', nargs = '+', default = ['mSE'])
+    parser.add_argument('--st-importance-factor', type = float, nargs = '+', default = [1])
+    parser.add_argument('--algorithm', nargs = '+', choices = sorted(ALGORITHMS), default = ['hybrid'])
+    parser.add_argument('--n', type = int, default = 20)
+    parser.add_argument('--iter-max', type = int, default = 50)
+    parser.add_argument('--backend', default = 'foh')
+    parser.add_argument('--seed', type = int, default = 0)
+    parser.add_argument('--time-limit', type = float, default = None, help = 'seconds each job optimises for at most')
+    parser.add_argument('--max-evaluations', type = int, default = None)
+    parser.add_argument('--stagnation-window', type = int, default = None)
+    parser.add_argument('--workers', type = int, default = None)
+    parser.add_argument('--retries', type = int, default = 1)
+    parser.add_argument('--timeout', type = float, default = None)
+    parser.add_argument('--cpu-limit', type = int, default = None)
+    parser.add_argument('--memory-limit', type = int, default = None)
+    parser.add_argument('--store', default = None, help = 'result store directory for signals and measurements')
+    parser.add_argument('--chunk-size', type = int, default = 64)
+    parser.add_argument('--output', default = 'sweep_results.csv')
+    args = parser.parse_args()
+
+    configs = grid(args.m, args.q, args.cost_f, args.st_importance_factor, args.algorithm,
+                   n = args.n, iter_max = args.iter_max, backend = args.backend, seed = args.seed,
+                   time_limit = args.time_limit, max_evaluations = args.max_evaluations,
+                   stagnation_window = args.stagnation_window)
+
+    store = None if args.store is None else result_store.result_store(args.store, mode = 'a')
+
+    results = sweep(configs, args.workers, args.retries, args.timeout, args.cpu_limit, args.memory_limit,
+                    store, args.chunk_size)
+
+    write_table(args.output, results)
+
+    failed = sum(record['status'] != 'ok' for record in results)
+    print(f'{len(results)} jobs, {failed} failed. Results written to {args.output}')
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# the modules live at the top of the repository, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import soa_engine
+import soa_models
+
+
+@pytest.fixture
+def problem():
+    """
+    Step problem of two SOAs, as taken by the optimisers
+    """
+
+    return dict(m = 12, q = 2, cost_f = 'mSE', st_importance_factor = 1, **soa_models.step_problem(2))
+
+
+@pytest.fixture
+def population():
+    """
+    Random drive signals of the problem fixture
+    """
+
+    return np.random.RandomState(0).uniform(-1, 1, (16, 24))
+
+
+@pytest.fixture
+def engine(problem):
+    """
+    Operator backend engine of the problem fixture
+    """
+    p = problem
+
+    return soa_engine.soa_engine(p['sim_model'], p['t2'], p['X0'], p['m'], p['q'], p['cost_f'],
+                                 p['st_importance_factor'], p['SP'], backend = 'operator')
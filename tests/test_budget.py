@@ -0,0 +1,48 @@
+import pytest
+
+import budget
+import driver
+
+
+def test_limits():
+    limits = budget.budget(time_limit = 3600, max_evaluations = 10)
+
+    assert limits.exhausted(9) is None
+    assert limits.exhausted(10) == 'max_evaluations'
+
+    assert budget.budget().exhausted(10 ** 9) is None
+    assert budget.budget(time_limit = 0).exhausted(0) == 'time_limit'
+
+
+@pytest.fixture
+def run_config(problem):
+
+    return dict(problem, backend = 'operator', iter_max = 20, rep = 10, threshold = 1.0, seed = 1)
+
+
+def test_run_stops_at_max_evaluations(run_config):
+    pso = driver.hybrid_pso(8, max_evaluations = 100, **run_config)
+    pso.run()
+
+    result = pso.result()
+
+    assert result['stop_reason'] == 'max_evaluations'
+    assert 100 <= result['evaluations'] < 200 and result['iterations'] < 20
+    assert result['gbest_cost'] == pytest.approx(pso.engine.get_cost(result['gbest']), rel = 1e-12)
+
+
+def test_run_stops_at_time_limit(run_config):
+    pso = driver.hybrid_pso(8, time_limit = 0, **run_config)
+    pso.run()
+
+    assert pso.stop_reason == 'time_limit' and pso.iteration <= 1
+
+
+def test_run_without_limits(run_config):
+    pso = driver.hybrid_pso(8, **dict(run_config, iter_max = 3))
+    pso.run()
+
+    result = pso.result()
+
+    assert result['stop_reason'] == 'iter_max' and result['iterations'] == 3
+    assert result['rise_time'].shape == (2,) and result['PV'].shape == result['t'].shape
@@ -0,0 +1,132 @@
+import random
+
+import numpy as np
+import pytest
+
+import checkpoint
+import driver
+import scheduler
+
+
+class counter(checkpoint.stateful):
+
+    STATE = ('count', 'values')
+
+    def __init__(self):
+
+        self.count = 0
+        self.values = np.zeros(3)
+
+
+def test_flatten_round_trip():
+    state = {'a': np.arange(3), 'b': {'c': 1.5, 'd': {'e': np.ones((2, 2))}}, 'f': 'name'}
+
+    arrays = checkpoint.flatten(state)
+
+    assert sorted(arrays) == ['a', 'b.c', 'b.d.e', 'f']
+
+    restored = checkpoint.unflatten(arrays)
+
+    assert np.array_equal(restored['b']['d']['e'], np.ones((2, 2)))
+    assert restored['b']['c'] == 1.5 and restored['f'] == 'name'
+
+
+def test_flatten_rejects_objects():
+
+    with pytest.raises(TypeError):
+        checkpoint.flatten({'a': {'b': [None, 1]}})
+
+
+def test_save_load(tmp_path):
+    path = tmp_path / 'state.npz'
+    state = {'x': np.random.rand(4, 3), 'nested': {'n': 7}}
+
+    checkpoint.save(path, state)
+    restored = checkpoint.load(path)
+
+    assert np.array_equal(restored['x'], state['x']) and int(restored['nested']['n']) == 7
+    assert [p.name for p in tmp_path.iterdir()] == ['state.npz']
+
+
+def test_load_rejects_other_versions(tmp_path):
+    path = tmp_path / 'state.npz'
+    np.savez(path, version = np.array(checkpoint.VERSION + 1))
+
+    with pytest.raises(ValueError):
+        checkpoint.load(path)
+
+
+def test_rng_state_round_trip(tmp_path):
+    np.random.seed(3)
+    random.seed(3)
+    np.random.normal()
+
+    checkpoint.save(tmp_path / 'rng.npz', {'rng': checkpoint.rng_state()})
+    expected = (np.random.normal(), np.random.rand(), random.random(), random.gauss(0, 1))
+
+    np.random.seed(4)
+    random.seed(4)
+    checkpoint.set_rng_state(checkpoint.load(tmp_path / 'rng.npz')['rng'])
+
+    assert (np.random.normal(), np.random.rand(), random.random(), random.gauss(0, 1)) == expected
+
+
+def test_stateful_round_trip(tmp_path):
+    original = counter()
+    original.count = 5
+    original.values[:] = [1, 2, 3]
+
+    checkpoint.save(tmp_path / 'c.npz', original.state_dict())
+
+    restored = counter()
+    restored.load_state_dict(checkpoint.load(tmp_path / 'c.npz'))
+
+    assert restored.count == 5 and isinstance(restored.count, int)
+    assert np.array_equal(restored.values, [1, 2, 3])
+
+    # the state is a copy
+    original.values[0] = 9
+    assert restored.values[0] == 1
+
+
+@pytest.fixture
+def run_config(problem):
+
+    return dict(problem, backend = 'operator', iter_max = 6, rep = 10, threshold = 1.0)
+
+
+def test_resume_continues_the_run(tmp_path, run_config):
+    path = tmp_path / 'run.npz'
+
+    reference = driver.hybrid_pso(8, seed = 1, **run_config)
+    reference.run()
+
+    interrupted = driver.hybrid_pso(8, seed = 1, checkpoint_path = path, checkpoint_every = 3, **run_config)
+    interrupted.iter_max = 3
+    interrupted.run()
+
+    resumed = driver.hybrid_pso(8, seed = 2, **run_config)
+    resumed.load(path)
+    resumed.run()
+
+    assert resumed.iteration == reference.iteration
+    assert np.array_equal(resumed.gbest, reference.gbest)
+    assert resumed.gbest_cost_history == reference.gbest_cost_history
+    assert np.array_equal(resumed.cpso.x, reference.cpso.x)
+    assert resumed.chaos.rep == reference.chaos.rep
+    assert np.array_equal(resumed.history.columns()['gbest_cost'], reference.gbest_cost_history[1:])
+
+
+def test_resume_with_a_scheduler_added(tmp_path, run_config):
+    path = tmp_path / 'run.npz'
+
+    interrupted = driver.hybrid_pso(8, seed = 1, checkpoint_path = path, checkpoint_every = 3, **run_config)
+    interrupted.iter_max = 3
+    interrupted.run()
+
+    resumed = driver.hybrid_pso(8, seed = 2, scheduler = scheduler.bandit(rep = 10), **run_config)
+    resumed.load(path)
+    resumed.run()
+
+    assert resumed.iteration == run_config['iter_max']
+    assert len(resumed.scheduler.decisions) > 0
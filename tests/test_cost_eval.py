@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import cost_eval
+import soa_engine
+
+
+def test_mse_kernel_matches_the_definition():
+    rng = np.random.RandomState(2)
+    t = np.linspace(0, 1, 50)
+    PV = rng.rand(4, 2, 50)
+    SP = rng.rand(2, 50)
+
+    costs = cost_eval.stage_costs(t, PV, 'mSE', 1, SP)
+
+    expected = [[np.mean((PV[i, j] - SP[j]) ** 2) for j in range(2)] for i in range(4)]
+
+    assert np.allclose(costs, expected, rtol = 1e-12)
+    assert np.allclose(cost_eval.batch_cost(t, PV, 'mSE', 1, SP), np.sum(expected, axis = 1), rtol = 1e-12)
+
+    # constant levels are broadcast over the samples
+    assert np.allclose(cost_eval.stage_costs(t, PV, 'mSE', 1, [0.5, 0.25]),
+                       cost_eval.stage_costs(t, PV, 'mSE', 1, np.array([[0.5] * 50, [0.25] * 50])))
+
+
+def test_mse_bound_never_exceeds_the_cost():
+    rng = np.random.RandomState(3)
+    y = rng.normal(0.2, 1, (20, 120))
+    SP = rng.rand(120)
+
+    # the final output is lifted so its minimum is at least 0
+    PV = y - np.minimum(y.min(axis = 1, keepdims = True), 0)
+    cost = np.mean((PV - SP) ** 2, axis = 1)
+
+    bound = cost_eval.mse_bound(20, 120)
+    previous = np.zeros(20)
+
+    for start in range(0, 120, 30):
+        bound.update(y[:, start:start + 30], SP[start:start + 30])
+        lower = bound.lower()
+
+        assert np.all(lower <= cost * (1 + 1e-12))
+        assert np.all(lower >= previous * (1 - 1e-12))
+        previous = lower
+
+    assert np.allclose(lower, cost, rtol = 1e-12)
+
+
+def engines(problem, SP = None, **kwargs):
+    p = problem
+    SP = p['SP'] if SP is None else SP
+
+    return [soa_engine.soa_engine(p['sim_model'], p['t2'], p['X0'], p['m'], p['q'], p['cost_f'],
+                                  p['st_importance_factor'], SP, backend = 'operator', early_termination = early,
+                                  **kwargs)
+            for early in (False, True)]
+
+
+@pytest.mark.parametrize('SP', [None, [0.8, 0.8]])
+@pytest.mark.parametrize('block_size', [None, 40])
+def test_thresholds(problem, population, SP, block_size):
+    plain, early = engines(problem, SP, block_size = block_size)
+
+    costs = plain.evaluate_batch(population)
+    threshold = np.full(len(population), np.median(costs))
+
+    # without early termination a threshold changes nothing
+    assert np.array_equal(plain.evaluate_batch(population, threshold), costs)
+
+    # with it, only signals above their threshold may stop early, the
+    # others keep their exact cost
+    result = early.evaluate_batch(population, threshold)
+    stopped = np.isinf(result)
+
+    assert np.all(costs[stopped] > threshold[stopped])
+    assert np.allclose(result[~stopped], costs[~stopped], rtol = 1e-12)
+    assert early.rejections == np.count_nonzero(stopped)
+
+
+def test_scalar_threshold(problem, population):
+    plain, early = engines(problem, block_size = 20)
+
+    costs = plain.evaluate_batch(population)
+
+    # a threshold under every cost stops each signal in its first block
+    assert np.all(early.evaluate_batch(population, costs.min() / 10) == soa_engine.REJECTED)
+    assert np.array_equal(plain.evaluate_batch(population, costs.min() / 10), costs)
+
+    assert np.allclose(early.evaluate_batch(population, costs.max()), costs, rtol = 1e-12)
@@ -0,0 +1,60 @@
+import numpy as np
+
+import detect_premature_conv
+
+
+def collapsed(n = 20, num_points = 24, seed = 0):
+    rng = np.random.RandomState(seed)
+    gbest = rng.uniform(-1, 1, num_points)
+
+    return gbest + rng.uniform(-1e-3, 1e-3, (n, num_points)), gbest
+
+
+def test_radius_matches_the_element_loop():
+    x, gbest = collapsed()
+
+    radius = 0
+    for j in range(len(x)):
+        radius = max(radius, np.linalg.norm(x[j] - gbest) / 24)
+
+    assert np.isclose(detect_premature_conv.swarm_radius(x, gbest, 24), radius)
+
+
+def test_detect_regroup():
+    x, gbest = collapsed()
+    d = detect_premature_conv.detect_premature_conv(24, iter_max = 10)
+
+    assert d.detect_regroup(x, gbest, 1)
+    assert d.r == np.e
+
+    # the threshold divisor grew, a spread swarm is not converged
+    spread = x + np.random.RandomState(1).uniform(-1, 1, x.shape)
+    assert not d.detect_regroup(spread, gbest, 2)
+    assert np.isclose(d.d_norm[1], detect_premature_conv.swarm_radius(spread, gbest, 24) / 2)
+
+
+def test_detect_stagnation():
+    x, gbest = collapsed()
+    d = detect_premature_conv.detect_premature_conv(24, iter_max = 10)
+
+    # no improvement while the swarm stays collapsed
+    for i in range(1, 5):
+        d.detect_regroup(x, gbest, i)
+
+    history = [2.0, 1.0, 1.0, 1.0, 1.0]
+
+    assert d.detect_stagnation(history, 4, window = 3, radius = 1e-3)
+    assert not d.detect_stagnation(history, 4, window = 4, radius = 1e-3)
+    assert not d.detect_stagnation(history, 4, window = 3, radius = 1e-6)
+    assert not d.detect_stagnation(history, 2, window = 3, radius = 1e-3)
+
+
+def test_state_round_trip():
+    x, gbest = collapsed()
+    d = detect_premature_conv.detect_premature_conv(24, iter_max = 10)
+    d.detect_regroup(x, gbest, 1)
+
+    restored = detect_premature_conv.detect_premature_conv(24, iter_max = 10)
+    restored.load_state_dict(d.state_dict())
+
+    assert restored.r == d.r and np.array_equal(restored.swarm_radius, d.swarm_radius)
@@ -0,0 +1,104 @@
+import numpy as np
+
+import eval_cache
+import soa_engine
+
+
+def test_lru_eviction():
+    cache = eval_cache.cost_cache(maxsize = 2)
+    keys = [cache.key(np.full(4, i)) for i in range(3)]
+
+    cache.put(keys[0], 0.0)
+    cache.put(keys[1], 1.0)
+    assert cache.get(keys[0]) == 0.0
+
+    # keys[1] is now the least recently used
+    cache.put(keys[2], 2.0)
+
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == 0.0 and cache.get(keys[2]) == 2.0
+    assert cache.stats() == dict(hits = 3, misses = 1, hit_rate = 0.75, evictions = 1, size = 2)
+
+
+def test_decimals_share_entries():
+    cache = eval_cache.cost_cache(decimals = 6)
+    p = np.linspace(-1, 1, 8)
+
+    assert cache.key(p) == cache.key(p + 1e-9)
+    assert cache.key(np.zeros(3)) == cache.key(-np.zeros(3))
+    assert cache.key(p) != cache.key(p + 1e-5)
+
+    exact = eval_cache.cost_cache()
+    assert exact.key(p) != exact.key(p + 1e-9)
+
+
+def test_key_depends_on_stage_and_config():
+    cache = eval_cache.cost_cache()
+    p = np.ones(4)
+
+    keys = {cache.key(p), cache.key(p, stage = 0), cache.key(p, stage = 1),
+            cache.key(p, config = b'a'), cache.key(p, config = b'b')}
+
+    assert len(keys) == 5
+    assert all(len(key) == eval_cache.DIGEST_SIZE for key in keys)
+
+
+def test_engines_with_different_configurations_share_a_cache(problem, population):
+    p = problem
+    cache = eval_cache.cost_cache()
+
+    engines = [soa_engine.soa_engine(p['sim_model'], p['t2'], p['X0'], p['m'], p['q'], p['cost_f'],
+                                     p['st_importance_factor'], SP, backend = 'operator', cache = cache)
+               for SP in (p['SP'], [0.5, 0.5])]
+
+    costs = [engine.evaluate_batch(population) for engine in engines]
+
+    assert cache.hits == 0 and len(cache) == 2 * len(population)
+    assert not np.allclose(costs[0], costs[1])
+    assert np.array_equal(engines[0].evaluate_batch(population), costs[0])
+
+
+def test_state_round_trip():
+    cache = eval_cache.cost_cache(maxsize = 10, decimals = 3)
+
+    for i in range(5):
+        cache.put(cache.key(np.full(3, i)), float(i))
+    cache.get(cache.key(np.zeros(3)))
+    cache.get(cache.key(np.full(3, 9)))
+
+    restored = eval_cache.cost_cache(maxsize = 10, decimals = 3)
+    restored.load_state_dict(cache.state_dict())
+
+    assert restored.stats() == cache.stats()
+    assert restored.get(cache.key(np.full(3, 4))) == 4.0
+
+    # least recently used order is kept, 1 is evicted first
+    restored.maxsize = 4
+    restored.put(cache.key(np.full(3, 7)), 7.0)
+    assert restored.get(cache.key(np.full(3, 1))) is None
+    assert restored.get(cache.key(np.zeros(3))) == 0.0
+
+
+def test_empty_state_round_trip():
+    restored = eval_cache.cost_cache()
+    restored.load_state_dict(eval_cache.cost_cache().state_dict())
+
+    assert len(restored) == 0
+
+
+def test_stage_cache_gives_the_same_costs(problem, population):
+    p = problem
+    stage_cache = eval_cache.cost_cache()
+
+    plain, cached = (soa_engine.soa_engine(p['sim_model'], p['t2'], p['X0'], p['m'], p['q'], p['cost_f'],
+                                           p['st_importance_factor'], p['SP'], backend = 'foh', stage_cache = cache)
+                     for cache in (None, stage_cache))
+
+    # the second SOA of every signal changes, the first is reused
+    moved = population.copy()
+    moved[:, p['m']:] *= 0.5
+
+    for P in (population, moved):
+        assert np.allclose(cached.evaluate_batch(P), plain.evaluate_batch(P), rtol = 1e-12)
+
+    assert cached.stage_evaluations == 3 * len(population)
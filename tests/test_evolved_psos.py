@@ -0,0 +1,118 @@
+import copy
+import random
+
+import numpy as np
+import pytest
+
+import evolved_psos
+
+
+def reference_cls(opt, x, x_value, pbest, pbest_value, gbest, gbest_cost, gbest_cost_history):
+    """
+    The chaotic search element by element, as first written, with the
+    elite j of update mapped onto particle j + 1 and its pbest
+    """
+
+    dummy = np.tile(gbest, (opt.n, 1))
+    dummy_value = np.copy(pbest_value)
+
+    z = np.interp(np.copy(random.choice(pbest)), [opt.min_val, opt.max_val], [0, 1])
+
+    achieved = False
+
+    for i in range(opt.rep):
+
+        p = np.copy(dummy[np.argsort(dummy_value)[0]])
+
+        c = np.random.randint(low = 0, high = opt.q)
+
+        z = opt.mapping(z)
+
+        for g in range(c * opt.m, (c + 1) * opt.m):
+            p[g] = (np.interp(z[g], [0, 1], [opt.LB[g], opt.UB[g]]) + gbest[g]) / 2.0
+
+        fitness = opt.engine.get_cost(p)
+
+        idx = np.argsort(dummy_value)[-1]
+
+        if dummy_value[idx] > fitness:
+            dummy_value[idx] = fitness
+            for g in range(opt.m_c):
+                dummy[idx, g] = p[g]
+
+        if fitness < gbest_cost:
+
+            achieved = True
+
+            for g in range(opt.m):
+                gbest[g] = pbest[0, g] = x[0, g] = p[g]
+
+            if opt.change_range:
+                opt.a = opt.a * (1 - (gbest_cost_history[-1] - gbest_cost) / gbest_cost_history[-1])
+                for g in range(opt.m):
+                    opt.LB[g] = max(opt.LB[g], gbest[g] - opt.a * (opt.UB[g] - opt.LB[g]))
+                    opt.UB[g] = min(opt.UB[g], gbest[g] + opt.a * (opt.UB[g] - opt.LB[g]))
+
+            x_value[0] = pbest_value[0] = gbest_cost = fitness
+
+    for j, idx in enumerate(np.argsort(dummy_value)[:4 * opt.n // 5]):
+
+        for g in range(opt.m_c):
+            x[j + 1, g] = dummy[idx, g]
+
+        x_value[j + 1] = dummy_value[idx]
+
+        if dummy_value[idx] < pbest_value[j + 1]:
+            pbest_value[j + 1] = dummy_value[idx]
+            for g in range(opt.m_c):
+                pbest[j + 1, g] = dummy[idx, g]
+
+    if opt.rep >= 5:
+        opt.rep = opt.rep - 5
+
+    return (x, x_value, pbest, pbest_value, gbest, gbest_cost, achieved)
+
+
+@pytest.mark.parametrize('map_type', ['logistic', 'tent'])
+@pytest.mark.parametrize('change_range', [False, True])
+@pytest.mark.parametrize('lookahead', [None, 1])
+def test_cls_matches_the_element_loop(problem, engine, population, map_type, change_range, lookahead):
+
+    p = problem
+    n = 10
+
+    def optimiser():
+        return evolved_psos.chaos(n, p['m'], p['q'], p['sim_model'], p['t2'], p['X0'], p['cost_f'],
+                                  p['st_importance_factor'], p['SP'], map_type = map_type,
+                                  change_range = change_range, rep = 30, engine = engine, lookahead = lookahead)
+
+    x = population[:n]
+    pbest = np.clip(x + np.random.RandomState(1).normal(0, 0.1, x.shape), -1, 1)
+    x_value, pbest_value = engine.evaluate_batch(x), engine.evaluate_batch(pbest)
+    best = np.argmin(pbest_value)
+    state = (x, x_value, pbest, pbest_value, np.copy(pbest[best]), pbest_value[best], [2 * pbest_value[best]])
+
+    results = []
+
+    for vectorised in (True, False):
+
+        opt = optimiser()
+        search = opt.cls if vectorised else lambda *args: reference_cls(opt, *args)
+        np.random.seed(3)
+        random.seed(3)
+
+        # the searches run twice, the second from a narrower range and
+        # fewer repetitions
+        args = copy.deepcopy(state)
+        for _ in range(2):
+            out = search(*args)
+            args = out[:5] + (out[5], args[6] + [out[5]])
+
+        results.append((out, opt))
+
+    (out, opt), (expected, reference) = results
+
+    for a, b in zip(out[:6], expected[:6]):
+        assert np.array_equal(a, b)
+    assert out[6] == expected[6]
+    assert np.array_equal(opt.LB, reference.LB) and np.array_equal(opt.UB, reference.UB) and opt.rep == reference.rep
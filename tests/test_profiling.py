@@ -0,0 +1,54 @@
+import json
+
+import profiling
+
+
+def test_sections_count_only_while_enabled(tmp_path):
+    p = profiling.profiler()
+    evaluations = [0]
+
+    @p.timed('work')
+    def work(k):
+        evaluations[0] += k
+        return k
+
+    assert work(5) == 5
+    assert p.stats == {}
+
+    p.enable(counter = lambda: evaluations[0])
+    work(3), work(4)
+    p.improved('work', 0.5)
+    p.disable()
+    work(6)
+
+    s = p.summary()['work']
+
+    assert s['calls'] == 2 and s['evaluations'] == 7
+    assert s['improvement_per_evaluation'] == 0.5 / 7
+    assert p.report().splitlines()[1].startswith('work')
+
+    p.export(tmp_path / 'profile.json')
+
+    with open(tmp_path / 'profile.json') as f:
+        assert json.load(f)['work']['calls'] == 2
+
+
+def test_nested_sections():
+    p = profiling.profiler()
+
+    @p.timed('inner')
+    def inner():
+        pass
+
+    @p.timed('outer')
+    def outer():
+        inner()
+        inner()
+
+    p.enable()
+    outer()
+
+    summary = p.summary()
+
+    assert summary['outer']['calls'] == 1 and summary['inner']['calls'] == 2
+    assert summary['outer']['seconds'] >= summary['inner']['seconds']
@@ -0,0 +1,61 @@
+import numpy as np
+
+import regroup
+
+
+def swarm(n = 20, m_c = 12, seed = 0):
+    rng = np.random.RandomState(seed)
+
+    return rng.uniform(-1, 1, (n, m_c)), rng.uniform(-0.05, 0.05, (n, m_c)), rng.uniform(-1, 1, m_c)
+
+
+def test_regroup_matches_the_element_loop():
+    x, v, gbest = swarm()
+    n, m_c = x.shape
+
+    r = regroup.regroup(n, m_c, rho = 1.2, lmd = 0.1, rng = 0)
+    x_old = np.copy(x)
+    r.regroup(x, gbest, v)
+
+    # same draws as the regroup, one element at a time
+    draws = np.random.default_rng(0).uniform(0, 1, (n, m_c))
+
+    for g in range(m_c):
+        dist = max(abs(x_old[j, g] - gbest[g]) for j in range(n))
+
+        assert np.isclose(r.range_regroup[g], 1.2 * dist)
+        assert np.isclose(r.LB[g], gbest[g] - 0.6 * dist)
+        assert np.isclose(r.UB[g], gbest[g] + 0.6 * dist)
+        assert np.isclose(r.v_LB[g], - 0.12 * dist)
+        assert np.isclose(r.v_UB[g], 0.12 * dist)
+
+        for j in range(n):
+            expected = 0.7 * gbest[g] + 0.3 * x_old[j, g] * v[j, g] + draws[j, g] * 1.2 * dist - 0.6 * dist
+            assert np.isclose(x[j, g], expected)
+
+
+def test_regrouped_particles_stay_in_range():
+    x, v, gbest = swarm(seed = 1)
+
+    r = regroup.regroup(*x.shape, rho = 1.2, lmd = 0.1, rng = 1)
+    x_old = np.copy(x)
+    r.regroup(x, gbest, v)
+
+    # every particle lands in the regrouped range around 0.7 gbest + 0.3 x v
+    centre = 0.7 * gbest + 0.3 * x_old * v
+    assert (np.abs(x - centre) <= 0.5 * r.range_regroup + 1e-12).all()
+
+
+def test_state_round_trip():
+    x, v, gbest = swarm(seed = 2)
+
+    r = regroup.regroup(*x.shape, rho = 1.2, lmd = 0.1, rng = 2)
+    r.regroup(np.copy(x), gbest, v)
+
+    restored = regroup.regroup(*x.shape, rho = 1.2, lmd = 0.1, rng = 9)
+    restored.load_state_dict(r.state_dict())
+
+    assert np.array_equal(restored.LB, r.LB) and np.array_equal(restored.v_UB, r.v_UB)
+
+    # the random resets continue from the same draw
+    assert np.array_equal(restored.regroup(np.copy(x), gbest, v), r.regroup(np.copy(x), gbest, v))
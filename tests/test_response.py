@@ -0,0 +1,91 @@
+import types
+
+import numpy as np
+import pytest
+
+import response
+import soa_engine
+
+
+t = np.linspace(0, 20e-9, 240)
+
+
+def test_first_order_responses():
+    tau = np.array([0.5e-9, 1e-9, 2e-9])
+    PV = 1 - np.exp(- t / tau[:, None])
+
+    rt, st, os, st_index = response.measure(PV, t, tail = 0.01)
+
+    assert np.allclose(rt, tau * np.log(9), rtol = 0.05)
+    assert np.allclose(st, tau * np.log(20), rtol = 0.05)
+    assert np.allclose(os, 0, atol = 1e-2)
+
+
+def test_measure_matches_the_element_loop():
+    # falling steps and overshoot
+    PV = np.vstack([np.exp(- t / 1e-9) - 1, 1 - np.exp(- t / 1e-9) * np.cos(t * 2e9)])
+
+    rt, st, os, st_index = response.measure(PV, t)
+
+    for i, pv in enumerate(PV):
+        final = pv[-24:].mean()
+        y = (pv - pv[0]) / (final - pv[0])
+
+        assert np.isclose(rt[i], t[np.nonzero(y >= 0.9)[0][0]] - t[np.nonzero(y >= 0.1)[0][0]])
+        assert np.isclose(os[i], 100 * max(y.max() - 1, 0))
+        assert st_index[i] == max([k + 1 for k in range(240) if abs(y[k] - 1) > 0.05], default = 0)
+        assert st[i] == t[min(st_index[i], 239)]
+
+
+def test_settling_counts_from_the_step():
+    PV = 1 - np.exp(- t / 1e-9)
+
+    (_, st, _, st_index) = response.measure(PV, t)
+    (_, st_step, _, st_index_step) = response.measure(PV, t, t_step = t[60])
+
+    assert st_index == st_index_step and np.isclose(st - st_step, t[60])
+
+
+def test_engine_outputs(engine, population):
+    rt, st, os, st_index = engine.responses(population)
+
+    assert rt.shape == st.shape == os.shape == st_index.shape == (len(population), 2)
+
+
+def test_reference_counts_settling_from_the_step(monkeypatch):
+    # stand-in for soa.analyse, settled at a fixed index
+    class ResponseMeasurements:
+
+        def __init__(self, PV, t):
+
+            self.riseTime, self.overshoot, self.settlingTimeIndex = 1e-9, 5.0, 100
+            self.settlingTime = t[100] - t[0]
+
+    monkeypatch.setattr(response, 'analyse', types.SimpleNamespace(ResponseMeasurements = ResponseMeasurements))
+
+    (rt, st, os, st_index) = response.reference(np.zeros((3, 2, 240)), t, t_step = t[60])
+
+    assert st.shape == (3, 2) and st_index.dtype.kind == 'i'
+    assert np.allclose(st, t[100] - t[60])
+
+
+def test_measure_matches_analyse(problem, population):
+    # the reported metrics are measure()'s, checked against soa.analyse
+    # wherever the soa package is installed
+    pytest.importorskip('soa.analyse')
+
+    p = problem
+    engine = soa_engine.soa_engine(p['sim_model'], p['t2'], p['X0'], 24, 1, p['cost_f'],
+                                   p['st_importance_factor'], p['SP'], backend = 'operator')
+
+    PV = engine.outputs(population)[:, 0]
+    t_step = engine.T[np.argmax(engine.SP[0] != engine.SP[0, 0])]
+    dt = engine.T[1] - engine.T[0]
+
+    values = response.measure(PV, engine.T, t_step = t_step)
+    expected = response.reference(PV, engine.T, t_step = t_step)
+
+    assert np.allclose(values[0], expected[0], rtol = 0, atol = dt, equal_nan = True)
+    assert np.allclose(values[1], expected[1], rtol = 0, atol = dt)
+    assert np.allclose(values[2], expected[2], rtol = 1e-2, atol = 1e-6)
+    assert np.all(np.abs(values[3] - expected[3]) <= 1)
@@ -0,0 +1,70 @@
+import os
+import shutil
+
+import numpy as np
+import pytest
+
+import result_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = result_store.result_store(str(tmp_path / 'store'), mode = 'a')
+
+    store.append([dict(m = m, algorithm = 'hybrid', gbest_cost = 1.0 / m, PV = np.arange(240.0) * m,
+                       drive = np.ones(m)) for m in (12, 24)])
+    store.append([dict(m = 17, algorithm = 'cpso', gbest_cost = None, error = 'failed')])
+
+    return store
+
+
+def test_columns(store):
+    store = result_store.result_store(store.path)
+
+    assert len(store) == 3
+    assert store.columns['PV'] == 'signal' and store.columns['m'] == 'scalar'
+    assert store.column('m').dtype == np.int64
+    assert np.isnan(store.column('gbest_cost')[2])
+    assert list(store.column('error')) == ['', '', 'failed']
+    assert list(store.column('algorithm')) == ['hybrid', 'hybrid', 'cpso']
+
+
+def test_signals(store):
+    store = result_store.result_store(store.path)
+
+    assert np.array_equal(store.signal('PV', 1), np.arange(240.0) * 24)
+    assert store.signal('drive', 0).shape == (12,) and store.signal('drive', 2).shape == (0,)
+    assert store.signals('PV', [0, 1]).shape == (2, 240)
+
+    with pytest.raises(KeyError):
+        store.signal('m', 0)
+
+    with pytest.raises(IndexError):
+        store.signal('PV', 3)
+
+
+def test_where_and_row(store):
+
+    assert list(store.where(m = 24)) == [1]
+    assert list(store.where(algorithm = 'hybrid')) == [0, 1]
+    assert store.row(2)['error'] == 'failed'
+
+
+def test_read_only(store):
+    store = result_store.result_store(store.path)
+
+    with pytest.raises(ValueError):
+        store.append([dict(m = 1)])
+
+    with pytest.raises(FileNotFoundError):
+        result_store.result_store(store.path + '_missing')
+
+
+def test_orphaned_chunk_is_replaced(store):
+    # chunk renamed into place but never added to the schema
+    shutil.copytree(os.path.join(store.path, 'chunk_00000'), os.path.join(store.path, 'chunk_00002'))
+
+    store = result_store.result_store(store.path, mode = 'a')
+    store.append([dict(m = 40, algorithm = 'cpso', gbest_cost = 0.5)])
+
+    assert len(store) == 4 and list(store.column('m')) == [12, 24, 17, 40]
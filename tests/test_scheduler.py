@@ -0,0 +1,67 @@
+import math
+
+import numpy as np
+
+import scheduler
+
+
+def test_untried_operators_get_the_default_budget():
+    bandit = scheduler.bandit(rep = 20)
+
+    assert bandit.budget('chaos', 0) == 20
+    assert bandit.budget('ol', 0) == 1
+    assert math.isinf(bandit.decisions['score'][0])
+
+
+def test_budget_follows_the_rate_of_cpso():
+    bandit = scheduler.bandit(rep = 20, min_rep = 5, exploration = 0.0)
+
+    bandit.observe('cpso', 1.0, 0.9, 100)
+
+    # chaos as good as cpso, then ten times better, then useless
+    bandit.observe('chaos', 1.0, 0.9, 100)
+    assert bandit.budget('chaos', 1) == 20
+
+    bandit = scheduler.bandit(rep = 20, min_rep = 5, exploration = 0.0, discount = 1.0)
+    bandit.observe('cpso', 1.0, 0.99, 100)
+    bandit.observe('chaos', 1.0, 0.9, 100)
+    assert bandit.budget('chaos', 1) == bandit.max_rep == 40
+
+    bandit.observe('ol', 1.0, 1.0, 10)
+    assert bandit.budget('ol', 2) == 0
+
+    assert list(bandit.decisions['budget']) == [40, 0]
+    assert list(bandit.decisions['operator']) == [scheduler.OPERATORS.index('chaos'), scheduler.OPERATORS.index('ol')]
+
+
+def test_skipped_operators_are_retried():
+    bandit = scheduler.bandit(rep = 20, exploration = 0.5)
+
+    bandit.observe('cpso', 1.0, 0.9, 100)
+    bandit.observe('ol', 1.0, 1.0, 10)
+
+    budgets = []
+    for iteration in range(1, 100):
+        bandit.observe('cpso', 1.0, 0.9, 100)
+        budgets.append(bandit.budget('ol', iteration))
+
+    # the confidence bonus grows with the rounds ol sat out
+    assert budgets[0] == 0 and 1 in budgets
+
+
+def test_state_round_trip():
+    bandit = scheduler.bandit()
+
+    for iteration in range(4):
+        bandit.observe('cpso', 1.0, 0.95, 50)
+        bandit.observe('chaos', 1.0, 0.99, 200)
+        bandit.budget('chaos', iteration)
+
+    restored = scheduler.bandit()
+    restored.load_state_dict(bandit.state_dict())
+
+    assert np.array_equal(restored.decisions, bandit.decisions)
+    assert restored.decisions.dtype == scheduler.DTYPE
+    assert restored.rounds == bandit.rounds == 4
+    assert restored.budget('chaos', 4) == bandit.budget('chaos', 4)
+    assert len(restored.decisions) == 5
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import simulation
+import soa_engine
+import soa_models
+import steady_state
+
+
+@pytest.fixture
+def drive():
+    tf = soa_models.soa_tf()
+    T = np.linspace(0, 20e-9, 240)
+    U = np.repeat(np.random.RandomState(1).uniform(-1, 1, 24), 10)
+
+    return tf, U, T, steady_state.find_x_init(tf)
+
+
+@pytest.mark.parametrize('backend', ['foh', 'zoh'])
+def test_discrete_backends_match_the_reference(drive, backend):
+    passed, err = simulation.validate(*drive, backend = backend)
+
+    assert passed, err
+
+
+def test_foh_matches_lsim_closely(drive):
+    tf, U, T, X0 = drive
+
+    PV = simulation.simulate(tf, U, T, X0, backend = 'foh')
+    reference = simulation.simulate(tf, U, T, X0, backend = 'lsim')
+
+    assert np.max(np.abs(PV - reference)) <= 1e-6 * np.max(np.abs(reference))
+
+
+def test_discrete_backends_simulate_batches(drive):
+    tf, U, T, X0 = drive
+    U2 = np.stack([U, -U, np.zeros_like(U)])
+
+    batch = simulation.simulate(tf, U2, T, X0, backend = 'foh')
+
+    assert batch.shape == U2.shape
+    assert np.allclose(batch[1], simulation.simulate(tf, -U, T, X0, backend = 'foh'), rtol = 0, atol = 1e-12)
+
+
+def test_unknown_and_missing_backends(drive):
+
+    with pytest.raises(ValueError):
+        simulation.simulate(*drive, backend = 'rk4')
+
+    if not simulation.LSIM2:
+        with pytest.raises(ValueError):
+            simulation.simulate(*drive, backend = 'lsim2')
+
+
+def test_operator_engine_matches_foh(problem, population):
+    p = problem
+
+    PV, PV_operator = (soa_engine.soa_engine(p['sim_model'], p['t2'], p['X0'], p['m'], p['q'], p['cost_f'],
+                                             p['st_importance_factor'], p['SP'], backend = backend).outputs(population)
+                       for backend in ('foh', 'operator'))
+
+    assert np.allclose(PV, PV_operator, rtol = 1e-9, atol = 1e-12 * np.abs(PV).max())
@@ -0,0 +1,36 @@
+import numpy as np
+
+import simulation
+import soa_models
+import steady_state
+
+
+def test_state_is_an_equilibrium():
+    tf = soa_models.soa_tf()
+    T = np.linspace(0, 20e-9, 240)
+
+    for u in (-1.0, 0.5):
+        X0 = steady_state.find_x_init(tf, u)
+        PV = simulation.simulate(tf, np.full(240, u), T, X0, backend = 'foh')
+
+        # the output stays at the DC gain of the model times the drive level
+        assert np.allclose(PV, u * soa_models.num[-1] / soa_models.den[-1], rtol = 1e-9)
+
+
+def test_state_is_memoised():
+    tf = soa_models.soa_tf()
+    steady_state.cache_clear()
+
+    first = steady_state.find_x_init(tf)
+    first[:] = 0
+
+    second = steady_state.find_x_init(soa_models.soa_tf())
+
+    assert steady_state.cache_info().hits == 1
+    assert np.any(second != 0)
+
+
+def test_model_key_ignores_the_object():
+    a, b = soa_models.soa_tf(), soa_models.soa_tf()
+
+    assert a is not b and steady_state.model_key(a) == steady_state.model_key(b)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import soa_engine
+import upsampling
+
+
+def test_divisors_repeat_each_level():
+    U = np.zeros(10)
+    U[:2], U[2:] = -1, 0.5
+
+    assert np.array_equal(upsampling.upsampling(240).create(U), np.repeat(U, 24))
+
+
+@pytest.mark.parametrize('size', [7, 17, 100, 239])
+def test_other_sizes_keep_the_length(size):
+    U = np.random.RandomState(size).uniform(-1, 1, (3, size))
+
+    PV = upsampling.upsampling(240).create(U)
+
+    # every level is held at least once
+    assert PV.shape == (3, 240)
+    assert np.array_equal(np.unique(PV[0]), np.unique(U[0]))
+
+
+@pytest.mark.parametrize('mode', upsampling.MODES)
+def test_output_buffer(mode):
+    U = np.random.RandomState(0).uniform(-1, 1, (5, 12))
+    out = np.empty((5, 240))
+
+    assert upsampling.upsampling(240, mode).create(U, out = out) is out
+    assert np.array_equal(out, upsampling.upsampling(240, mode).create(U))
+
+
+def test_linear_interpolation():
+    U = np.random.RandomState(1).uniform(-1, 1, (5, 12))
+
+    linear = upsampling.upsampling(240, mode = 'linear').create(U)
+    reference = [np.interp(np.linspace(0, 11, 240), np.arange(12), u) for u in U]
+
+    assert np.allclose(linear, reference, rtol = 0, atol = 1e-14)
+    assert np.allclose(upsampling.upsampling(240, mode = 'linear').create(np.arange(5.0)), np.linspace(0, 4, 240))
+
+
+def test_full_length_input_is_unchanged():
+    U = np.random.RandomState(2).uniform(-1, 1, (2, 240))
+
+    assert np.array_equal(upsampling.upsampling(240, mode = 'linear').create(U), U)
+
+
+def test_engine_reuses_its_buffer(problem, population):
+    p = problem
+    engine = soa_engine.soa_engine(p['sim_model'], p['t2'], p['X0'], p['m'], p['q'], p['cost_f'],
+                                   p['st_importance_factor'], p['SP'], backend = 'foh')
+
+    first = engine.upsample(population[:, :12])
+    assert engine.upsample(population[:, 12:]) is first
+    assert engine.upsample(population[:4, :12]) is not first
+
+    # threads get buffers of their own, so costs match the serial engine
+    threaded = soa_engine.soa_engine(p['sim_model'], p['t2'], p['X0'], p['m'], p['q'], p['cost_f'],
+                                     p['st_importance_factor'], p['SP'], backend = 'foh', executor = 'thread',
+                                     workers = 4, chunk_size = 2)
+
+    with threaded:
+        assert np.array_equal(threaded.evaluate_batch(population), engine.evaluate_batch(population))
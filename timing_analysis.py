@@ -2,51 +2,45 @@ import numpy as np
 from scipy import signal
 import matplotlib.pyplot as plt
 from IPython.display import display
-import sys
 import pandas as pd
 import matplotlib
 
-
-sys.path.append('C:\\Users\\billv\\3project\\soa_driving\\pso\\soa')
-
-from soa import analyse
-
-class ups:
-    
-    # each upsampling instance can be set to have different points
-    def __init__(self, points):
-        self.points = points
-    
-
-    # main method of upsampling class
-    def create(self, *args):
-    # *args: list as input     
-        input = np.array(*args)
-        
-        if input.size != self.points:
-            n = self.points // input.size
-            
-            new_input = np.repeat(input, n)
-            
-            return new_input
-        
-        else:
-            return input
-
+import response
+import result_store
+import soa_models
+from upsampling import upsampling
 
 
 def timing_analysis(PV_str, curr_iter, t):
     PV_df = pd.read_csv(PV_str)
-    PV = PV_df['Data'].tolist()
-    responseMeasurementsObject = analyse.ResponseMeasurements(PV, t) 
+    PV = PV_df['Data'].to_numpy()
 
-    rt = responseMeasurementsObject.riseTime
-    st = responseMeasurementsObject.settlingTime
-    os = responseMeasurementsObject.overshoot
-    st_index = responseMeasurementsObject.settlingTimeIndex
+    (rt, st, os, st_index) = response.measure(PV, t)
 
     return [rt, st, os, st_index]
 
+def store_analysis(path, **criteria):
+    """
+    This method tabulates the measurements of the optimised outputs of a
+    sweep from its result store. run_job measured them with the set point
+    step as t_step, so the stored columns are read rather than measuring
+    the PV signals again
+    Args:
+    - path = result store directory written by sweep.py
+    - criteria = column values selecting rows, e.g. algorithm = 'hybrid'
+    Returns:
+    - DataFrame of rt, st, os and st index indexed by m
+    """
+    store = result_store.result_store(path)
+    rows = store.where(status = 'ok', **criteria)
+
+    df = pd.DataFrame({label: store.column(name)[rows] for (label, name) in
+                       (('Rise Time', 'rise_time'), ('Settling Time', 'settling_time'),
+                        ('Overshoot', 'overshoot'), ('ST index', 'settling_index'))})
+    df.index = store.column('m')[rows]
+
+    return df
+
 def find_factor(n):
     factor_values = []
     for i in range(1, n + 1):
@@ -59,26 +53,13 @@ if __name__ == '__main__':
     U = np.zeros(num_points) # initial drive signal (e.g. a step)
     U[:int(0.25*num_points)],U[int(0.25*num_points):] = -1, 0.5
     up = 240
-    p = ups(up)
+    p = upsampling(up)
     U = p.create(U)
     UT = []
     for i in U:
         UT.append(np.array([i]))
 
-    num = [2.01199757841099e85]
-    den = [
-        1.64898505756825e0,
-        4.56217233166632e10,
-        3.04864287973918e21,
-        4.76302109455371e31,
-        1.70110870487715e42,
-        1.36694076792557e52,
-        2.81558045148153e62,
-        9.16930673102975e71,
-        1.68628748250276e81,
-        2.40236028415562e90,
-    ]
-    tf = signal.TransferFunction(num, den)
+    tf = soa_models.soa_tf()
 
     time_start = 0
     time_stop = 20e-9
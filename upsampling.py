@@ -1,34 +1,112 @@
-import numpy as np
-import copy
-
-class upsampling:
-
-    # each upsampling instance can be set to have different points
-    def __init__(self, points):
-        self.points = points
-    
-
-    # main method of upsampling class
-    def create(self, *args):
-    # *args: list as input     
-        input = np.array(*args)
-        
-        if input.size != self.points:
-            n = self.points // input.size
-            
-            new_input = np.repeat(input, n)
-            
-            return new_input
-        
-        else:
-            return input
-    
-if __name__ == '__main__':
-    num_points = 10
-    init_OP = np.zeros(num_points) # initial drive signal (e.g. a step)
-    init_OP[:int(0.25*num_points)],init_OP[int(0.25*num_points):] = -1, 0.5
-    
-    p = upsampling(20)
-    print(init_OP)
-    init_OP = p.create(init_OP)
+import functools
+
+import numpy as np
+
+
+# upsampling modes: hold repeats each level, linear interpolates between
+# the levels (first and last levels land on the first and last points)
+MODES = ('hold', 'linear')
+
+
+@functools.lru_cache(maxsize=None)
+def index_map(size, points):
+    """
+    This method maps every output point to the input level it holds. Point
+    k takes level floor(k * size / points), so when size divides points
+    every level is repeated points // size times, as np.repeat, and
+    otherwise the levels share the points as evenly as possible
+    Args:
+    - size = number of input levels
+    - points = number of output points
+    Returns:
+    - read-only (points,) array of level indices
+    """
+    idx = np.arange(points) * size // points
+    idx.flags.writeable = False
+
+    return idx
+
+
+@functools.lru_cache(maxsize=None)
+def linear_map(size, points):
+    """
+    This method returns the (size x points) matrix of linear interpolation
+    weights, so a batch of levels is interpolated by one matrix multiply
+    straight into the output, without temporaries
+    Returns:
+    - read-only matrix whose column k weighs the levels either side of
+    output point k
+    """
+    position = np.linspace(0, size - 1, points)
+
+    lower = np.minimum(np.floor(position).astype(int), max(size - 2, 0))
+    upper = np.minimum(lower + 1, size - 1)
+    weight = position - lower
+
+    W = np.zeros((size, points))
+    np.add.at(W, (lower, np.arange(points)), 1 - weight)
+    np.add.at(W, (upper, np.arange(points)), weight)
+    W.flags.writeable = False
+
+    return W
+
+
+class upsampling:
+
+    # each upsampling instance can be set to have different points
+    def __init__(self, points, mode = 'hold'):
+        '''
+        Upsampling of drive signals to the simulation grid
+
+        Parameters:
+        - points: number of output points
+        - mode: 'hold' or 'linear', see MODES
+        '''
+
+        if mode not in MODES:
+            raise ValueError(f'Unknown upsampling mode {mode}')
+
+        self.points = points
+        self.mode = mode
+
+
+    # main method of upsampling class
+    def create(self, U, out = None):
+        """
+        This method upsamples a drive signal, or every row of a (signals x
+        size) batch, to points samples. Inputs already of length points are
+        returned unchanged (or copied into out)
+        Args:
+        - U = (size,) or (signals x size) levels
+        - out = optional array of shape U.shape[:-1] + (points,) to write into
+        Returns:
+        - upsampled signal(s)
+        """
+        U = np.asarray(U, dtype=float)
+        size = U.shape[-1]
+
+        if size == self.points:
+            if out is None:
+                return U
+
+            out[...] = U
+            return out
+
+        if out is None:
+            out = np.empty(U.shape[:-1] + (self.points,))
+
+        if self.mode == 'hold':
+            return np.take(U, index_map(size, self.points), axis=-1, out=out)
+
+        return np.matmul(U, linear_map(size, self.points), out=out)
+
+
+if __name__ == '__main__':
+    num_points = 10
+    init_OP = np.zeros(num_points) # initial drive signal (e.g. a step)
+    init_OP[:int(0.25*num_points)],init_OP[int(0.25*num_points):] = -1, 0.5
+    
+    p = upsampling(20)
+    print(init_OP)
+    init_OP = p.create(init_OP)
     print(init_OP)
\ No newline at end of file